@@ -1,44 +1,121 @@
+import asyncio
 import base64
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
 
-import firebase_admin
-import requests
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from firebase_admin import auth, credentials, firestore
+
+from http_client import get_http_client
 
 load_dotenv()
 
 FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+SIGNING_KEY_REFRESH = float(os.getenv("SIGNING_KEY_REFRESH", 60 * 60))  # seconds
+
+_firebase_app = None
+_firebase_lock = threading.Lock()
+_db = None
+_key_refresh: Optional[asyncio.Task] = None
+
+
+def get_firebase_app():
+    """
+    Initializes the Firebase Admin SDK on first use.
+
+    firebase_admin is slow to import, and routes like /v1/login only call
+    Firebase's REST API, so a cold start shouldn't pay for it up front.
+    """
+    global _firebase_app
+    # Token verification runs in the threadpool, so two threads can get here
+    with _firebase_lock:
+        if _firebase_app is None:
+            import firebase_admin
+            from firebase_admin import credentials
+
+            encoded_key = os.environ.get("FIREBASE_SERVICE_ACCOUNT_KEY")
+            if not encoded_key:
+                raise ValueError(
+                    "FIREBASE_SERVICE_ACCOUNT environment variable is missing."
+                )
 
-encoded_key = os.environ.get("FIREBASE_SERVICE_ACCOUNT_KEY")
-if not encoded_key:
-    raise ValueError("FIREBASE_SERVICE_ACCOUNT environment variable is missing.")
+            decoded_key = base64.b64decode(encoded_key).decode("utf-8")
+            service_account_info = json.loads(decoded_key)
 
-decoded_key = base64.b64decode(encoded_key).decode("utf-8")
-service_account_info = json.loads(decoded_key)
+            cred = credentials.Certificate(service_account_info)
+            _firebase_app = firebase_admin.initialize_app(cred)
+    return _firebase_app
 
-cred = credentials.Certificate(service_account_info)
-firebase_admin.initialize_app(cred)
 
+def get_db():
+    """Returns the async Firestore client, creating it on first use."""
+    global _db
+    if _db is None:
+        from firebase_admin import firestore_async
+
+        _db = firestore_async.client(get_firebase_app())
+    return _db
 
-db = firestore.client()
 
 # Define HTTPBearer for Authorization header
 security = HTTPBearer()
 
+# sha256 of an ID token -> its verified claims, least recently used first
+verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _fetch_signing_keys():
+    """Fetches Google's token signing certificates into firebase_admin's HTTP cache."""
+    from firebase_admin import _token_gen, auth
+
+    verifier = auth._get_client(get_firebase_app())._token_verifier
+    verifier.request(url=_token_gen.ID_TOKEN_CERT_URI)
+
+
+async def refresh_signing_keys():
+    """Keeps the signing certificates cached so verification never waits on them."""
+    while True:
+        try:
+            await run_in_threadpool(_fetch_signing_keys)
+        except Exception as e:
+            print(f"Error prefetching token signing keys: {e}")
+        await asyncio.sleep(SIGNING_KEY_REFRESH)
 
-def authenticate_with_firebase(email: str, password: str):
+
+def start_signing_key_refresh():
+    """
+    Starts refresh_signing_keys the first time a token needs verifying.
+
+    Starting it at startup would initialize the Firebase Admin SDK on every
+    cold start, even when the first requests are / or /v1/login.
+    """
+    global _key_refresh
+    if _key_refresh is None or _key_refresh.done():
+        _key_refresh = asyncio.create_task(refresh_signing_keys())
+
+
+def stop_signing_key_refresh():
+    if _key_refresh is not None:
+        _key_refresh.cancel()
+
+
+async def authenticate_with_firebase(email: str, password: str):
     url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
     data = {
         "email": email,
         "password": password,
         "returnSecureToken": True,
     }
-    response = requests.post(url, json=data)
+    response = await get_http_client().post(url, json=data)
     if response.status_code != 200:
         raise HTTPException(
             status_code=400,
@@ -48,28 +125,50 @@ def authenticate_with_firebase(email: str, password: str):
 
 
 # Helper to Refresh Token
-def refresh_firebase_token(refresh_token: str):
+async def refresh_firebase_token(refresh_token: str):
     url = f"https://securetoken.googleapis.com/v1/token?key={FIREBASE_API_KEY}"
     data = {
         "grant_type": "refresh_token",
         "refresh_token": refresh_token,
     }
-    response = requests.post(url, data=data)
+    response = await get_http_client().post(url, data=data)
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail="Token refresh failed")
     return response.json()
 
 
-def get_firebase_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_firebase_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+):
     """Get the user details from Firebase, based on TokenID"""
+    start_signing_key_refresh()
     id_token = credentials.credentials
+    key = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    # A token verified before stays valid until it expires
+    claims = verified_tokens.get(key)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            verified_tokens.move_to_end(key)
+            return claims
+        del verified_tokens[key]
+
     try:
-        claims = auth.verify_id_token(id_token)
-        return claims
+        from firebase_admin import auth
+
+        # verify_id_token is blocking (it may fetch Google's public keys)
+        claims = await run_in_threadpool(
+            auth.verify_id_token, id_token, get_firebase_app()
+        )
     except Exception as e:
         logging.exception(e)
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    verified_tokens[key] = claims
+    while len(verified_tokens) > TOKEN_CACHE_SIZE:
+        verified_tokens.popitem(last=False)
+    return claims
+
 
 """
 TODO:
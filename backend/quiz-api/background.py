@@ -0,0 +1,13 @@
+import asyncio
+from typing import Set
+
+# The event loop only keeps weak references to tasks, so running ones are held here
+background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    """Runs coro in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
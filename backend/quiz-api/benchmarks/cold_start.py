@@ -0,0 +1,90 @@
+"""
+Measures a cold start: importing main, running the app's startup, and
+serving the first GET /, each in a fresh interpreter.
+
+    python benchmarks/cold_start.py --runs 10
+
+Also reports whether the cold start loaded firebase_admin or google.genai,
+which should only happen once a request needs them.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import asyncio, json, sys, time
+
+SETTLE = {settle}
+
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+import httpx
+
+
+async def first_request():
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/")
+            assert response.status_code == 200
+        served = time.perf_counter()
+        # Give background startup work time to show up in sys.modules
+        await asyncio.sleep(SETTLE)
+    return served
+
+
+served = asyncio.run(first_request())
+print(json.dumps({
+    "import": imported - started,
+    "first_response": served - imported,
+    "total": served - started,
+    "firebase_admin": "firebase_admin" in sys.modules,
+    "google.genai": "google.genai" in sys.modules,
+}))
+"""
+
+
+def run_once(settle: float) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.replace("{settle}", repr(settle))],
+        cwd=SERVICE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="seconds to stay up after the first response before checking modules",
+    )
+    args = parser.parse_args()
+
+    runs = [run_once(args.settle) for _ in range(args.runs)]
+    for field in ("import", "first_response", "total"):
+        values = [run[field] for run in runs]
+        print(
+            f"{field:>15}: median {statistics.median(values) * 1000:7.1f} ms"
+            f"  min {min(values) * 1000:7.1f} ms  max {max(values) * 1000:7.1f} ms"
+        )
+    for module in ("firebase_admin", "google.genai"):
+        loaded = sum(run[module] for run in runs)
+        print(f"{module:>15}: loaded in {loaded} of {len(runs)} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares requests.post, as auth.py used to call Firebase, with the shared
+pooled client from http_client.py, against a local stub of Firebase's
+token endpoint.
+
+    python benchmarks/outbound_http.py --calls 300
+
+Run from the service directory. The stub runs in-process over plain HTTP,
+so the numbers are the client's own overhead (a new session and TCP
+connection per requests.post call, against a reused pooled connection),
+not network latency. TLS handshakes are not covered; against the real
+HTTPS endpoints they add to every requests.post call, while the pooled
+client pays for them once per connection.
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import http_client  # noqa: E402
+
+stub = FastAPI()
+
+
+@stub.post("/v1/token")
+async def token():
+    return {"id_token": "token", "refresh_token": "refresh", "expires_in": "3600"}
+
+
+def start_stub() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(stub, port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1/token"
+
+
+async def requests_post(url: str):
+    # Blocking, on the event loop, as the old auth.py made it
+    return requests.post(url, data={"grant_type": "refresh_token"})
+
+
+async def pooled_client(url: str):
+    return await http_client.get_http_client().post(
+        url, data={"grant_type": "refresh_token"}
+    )
+
+
+async def bench(url: str, calls: int):
+    variants = [
+        ("requests.post", requests_post),
+        ("shared pooled client", pooled_client),
+    ]
+    # Each variant runs twice so the first pass can warm up imports and the pool
+    for name, call in variants * 2:
+        started = time.perf_counter()
+        for _ in range(calls):
+            (await call(url)).raise_for_status()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>21}: {elapsed / calls * 1000:6.2f} ms per call")
+
+    await http_client.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(bench(start_stub(), args.calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Drives /v1/start and /v1/answer for concurrent quiz users against the app
+in-process, with Firestore and Gemini replaced by the in-memory fakes from
+tests/fakes.py, and reports requests per second.
+
+    python benchmarks/quiz_load.py --users 50 --answers 5
+
+Each user starts a session and then answers its questions in turn. The
+Gemini gateway's limits are raised so they don't throttle the run; the
+fake Gemini sleeps --gemini-latency per call instead.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def report(name, seconds):
+    print(
+        f"{name:>16}: p50 {percentile(seconds, 50) * 1000:7.1f} ms"
+        f"  p95 {percentile(seconds, 95) * 1000:7.1f} ms"
+        f"  max {max(seconds) * 1000:7.1f} ms"
+    )
+
+
+async def run(args):
+    import httpx
+    from fastapi import Request
+
+    import auth
+    import functions
+    import main
+    from tests.fakes import FakeFirestore, FakeGemini
+
+    db = FakeFirestore()
+    gemini = FakeGemini(latency=args.gemini_latency)
+    auth._db = db
+    functions.get_genai_client = lambda: gemini
+
+    async def user_from_header(request: Request):
+        return {"uid": request.headers["x-bench-user"]}
+
+    main.app.dependency_overrides[auth.get_firebase_user] = user_from_header
+    latencies = {"/v1/start": [], "/v1/answer": []}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+
+        async def post(user_id, path, body):
+            started = time.perf_counter()
+            response = await client.post(
+                path, json=body, headers={"x-bench-user": user_id}
+            )
+            response.raise_for_status()
+            latencies[path].append(time.perf_counter() - started)
+            return response.json()
+
+        async def user(number):
+            user_id = f"user-{number}"
+            session = await post(user_id, "/v1/start", {"level": args.level})
+            for _ in range(args.answers):
+                await post(
+                    user_id,
+                    "/v1/answer",
+                    {"sessionId": session["sessionId"], "answer": "Diversify."},
+                )
+
+        # One user first, so lazy imports and the topic catalogue aren't measured
+        await user(args.users)
+        for samples in latencies.values():
+            samples.clear()
+        gemini.calls = 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*[user(number) for number in range(args.users)])
+        elapsed = time.perf_counter() - started
+
+    requests = sum(len(samples) for samples in latencies.values())
+    print(
+        f"{args.users} users x (1 start + {args.answers} answers), {args.level}, "
+        f"question pool {os.environ['QUESTION_POOL_SIZE']}, "
+        f"Gemini fake {args.gemini_latency * 1000:.0f} ms"
+    )
+    print(
+        f"{'wall time':>16}: {elapsed:.2f} s "
+        f"({requests / elapsed:.1f} req/s, {gemini.calls} Gemini calls)"
+    )
+    for path, samples in latencies.items():
+        report(path, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--answers", type=int, default=5)
+    parser.add_argument(
+        "--level", choices=["Beginner", "Intermediate", "Advanced"], default="Beginner"
+    )
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    # Read at import time, so they have to be set before main is imported
+    os.environ["QUESTION_POOL_SIZE"] = str(args.pool_size)
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(args.users * 3))
+    os.environ.setdefault("GEMINI_RATE_LIMIT", "10000")
+    os.environ.setdefault("GEMINI_BURST", str(args.users * 3))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+from fastapi import HTTPException
+
+from auth import get_db
+from background import spawn
+from functions import send_to_gemini
+from prompts import CHAT_SUMMARY_PROMPT
+
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", 10))  # user+model pairs
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 8000))
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", 10))  # messages
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", 256))  # sessions
+
+# (user id, chat session id) -> session state, least recently used first.
+# Each state is {"summary", "summarized_count", "message_count", "recent"},
+# where "recent" holds the messages the summary doesn't cover yet.
+hot_sessions: "OrderedDict[tuple, dict]" = OrderedDict()
+_summarizing: Set[tuple] = set()
+
+
+def _session_ref(user_id: str, chat_session_id: str):
+    return (
+        get_db()
+        .collection("chatHistory")
+        .document(user_id)
+        .collection("chatSessions")
+        .document(chat_session_id)
+    )
+
+
+def _estimate_tokens(message: dict) -> int:
+    # Roughly four characters per token for English text
+    return len(message.get("text") or "") // 4 + 1
+
+
+async def _load_session(user_id: str, chat_session_id: str) -> dict:
+    """Reads the summary and every message it doesn't cover from Firestore."""
+    session_ref = _session_ref(user_id, chat_session_id)
+    doc = await session_ref.get()
+    data = doc.to_dict() if doc.exists else {}
+    summarized_count = data.get("summarizedCount", 0)
+
+    # Sessions saved before messages moved to a subcollection keep them inline
+    inline = data.get("history", [])
+    recent = inline[summarized_count:]
+    query = (
+        session_ref.collection("messages")
+        .order_by("index")
+        .start_after({"index": max(summarized_count, len(inline)) - 1})
+    )
+    message_count = summarized_count + len(recent)
+    async for message_doc in query.stream():
+        message = message_doc.to_dict()
+        # A failed save can leave a gap, so new indexes continue after the last one
+        message_count = max(message_count + 1, message.pop("index", -1) + 1)
+        recent.append(message)
+
+    return {
+        "summary": data.get("summary"),
+        "summarized_count": summarized_count,
+        "message_count": message_count,
+        "recent": recent,
+    }
+
+
+async def get_chat_session(user_id: str, chat_session_id: str) -> dict:
+    """Returns the session state, from the hot-session cache when possible."""
+    key = (user_id, chat_session_id)
+    state = hot_sessions.get(key)
+    if state is None:
+        try:
+            state = await _load_session(user_id, chat_session_id)
+        except Exception as e:
+            # Not cached and not replaced with an empty session: appending to
+            # one would reuse message indexes that are already stored
+            print(f"Error loading chat history: {e}")
+            raise HTTPException(
+                status_code=503, detail="Chat history is unavailable, try again."
+            )
+        # Another request may have loaded the session while this one waited
+        state = hot_sessions.setdefault(key, state)
+    hot_sessions.move_to_end(key)
+    while len(hot_sessions) > CHAT_CACHE_SIZE:
+        hot_sessions.popitem(last=False)
+    return state
+
+
+def context_window(state: dict) -> tuple:
+    """
+    Returns (summary, messages) to send to Gemini for the next message.
+
+    Messages are the most recent CHAT_CONTEXT_TURNS turns the summary doesn't
+    cover, cut short at CHAT_CONTEXT_TOKENS; older ones reach the model
+    through the summary.
+    """
+    messages = []
+    budget = CHAT_CONTEXT_TOKENS
+    for message in reversed(state["recent"][-2 * CHAT_CONTEXT_TURNS :]):
+        budget -= _estimate_tokens(message)
+        if budget < 0:
+            break
+        messages.append(message)
+    messages.reverse()
+    # Keep the history starting on a user turn
+    if messages and messages[0]["role"] != "user":
+        messages = messages[1:]
+    return state["summary"], messages
+
+
+async def append_chat_messages(
+    user_id: str, chat_session_id: str, state: dict, messages: List[dict]
+):
+    """Stores new messages without rewriting the ones already saved."""
+    # The indexes are reserved before the commit, so a concurrent append to
+    # the same session can't reuse them
+    first_index = state["message_count"]
+    state["recent"].extend(messages)
+    state["message_count"] += len(messages)
+
+    session_ref = _session_ref(user_id, chat_session_id)
+    try:
+        batch = get_db().batch()
+        for offset, message in enumerate(messages):
+            batch.set(
+                session_ref.collection("messages").document(),
+                {"index": first_index + offset, **message},
+            )
+        batch.set(session_ref, {"messageCount": state["message_count"]}, merge=True)
+        await batch.commit()
+    except Exception as e:
+        print(f"Error saving chat history: {e}")
+        # The cached state now holds messages that were never stored, so the
+        # next request reloads the session from Firestore instead
+        key = (user_id, chat_session_id)
+        if hot_sessions.get(key) is state:
+            del hot_sessions[key]
+        return
+
+    schedule_summary(user_id, chat_session_id, state)
+
+
+def schedule_summary(user_id: str, chat_session_id: str, state: dict):
+    """Folds older messages into the summary once enough have built up."""
+    key = (user_id, chat_session_id)
+    overflow = len(state["recent"]) - 2 * CHAT_CONTEXT_TURNS
+    if key in _summarizing or overflow < CHAT_SUMMARY_BATCH:
+        return
+    _summarizing.add(key)
+    spawn(summarize(user_id, chat_session_id, state, overflow))
+
+
+async def summarize(user_id: str, chat_session_id: str, state: dict, count: int):
+    """Merges the oldest `count` unsummarized messages into the rolling summary."""
+    key = (user_id, chat_session_id)
+    try:
+        transcript = "\n".join(
+            f"{message['role']}: {message['text']}"
+            for message in state["recent"][:count]
+        )
+        summary = await send_to_gemini(
+            f"{CHAT_SUMMARY_PROMPT}\n"
+            f"Current summary:\n{state['summary'] or 'None'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        summarized_count = state["summarized_count"] + count
+        await _session_ref(user_id, chat_session_id).set(
+            {"summary": summary, "summarizedCount": summarized_count}, merge=True
+        )
+        # Only appends happen meanwhile, so the summarized messages are still first
+        state["summary"] = summary
+        state["summarized_count"] = summarized_count
+        del state["recent"][:count]
+    except Exception as e:
+        print(f"Error summarizing chat history: {e}")
+    finally:
+        _summarizing.discard(key)
@@ -1,24 +1,53 @@
+import hashlib
+import json
 import os
 import random
-from typing import List, Optional
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
 
 import csv
-import requests
 from fastapi import HTTPException
-from google import genai
-from google.genai import types
-from google.genai.types import GenerateContentConfig, GoogleSearch, Tool
 
-from auth import db
-from prompts import FINANCIAL_SYSTEM_PROMPT, QUESTION_PROMPT, SCORE_PROMPT
+from images import load_image
+from llm_gateway import gateway, is_rate_limited, request_key
+from prompts import (
+    EVALUATION_PROMPT,
+    FINANCIAL_SYSTEM_PROMPT,
+    QUESTION_PROMPT,
+    SCORE_PROMPT,
+)
 
-client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+MODEL = "gemini-2.0-flash"
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY not set in .env!")
 
-MODEL = "gemini-2.0-flash"
+@lru_cache(maxsize=None)
+def get_genai_client():
+    """Creates the Gemini client on first use; google.genai is slow to import."""
+    from google import genai
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY not set in .env!")
+    return genai.Client(api_key=api_key)
+
+
+async def generate_content(contents: list, config: Optional[dict] = None):
+    """Makes one generate_content call through the process-wide Gemini gateway."""
+    return await gateway.call(
+        lambda: get_genai_client().aio.models.generate_content(
+            model=MODEL, contents=contents, config=config
+        ),
+        key=request_key(MODEL, contents, config),
+    )
+
+
+def gemini_error(error: Exception, detail: str) -> HTTPException:
+    """Reports quota exhaustion as a 429 that clients can retry, anything else as a 500."""
+    if is_rate_limited(error):
+        return HTTPException(
+            status_code=429, detail="Gemini is over its rate limit, try again shortly."
+        )
+    return HTTPException(status_code=500, detail=detail)
 
 
 # Load the CSV file once
@@ -34,130 +63,205 @@ def load_csv(filename: str) -> list:
         return []
 
 
-data = load_csv("finance_topics_full.csv")
+def topic_id_for(level: str, topic: str) -> str:
+    """Derives a topic's id from its difficulty and name, not its place in the CSV."""
+    return hashlib.sha256(f"{level}\n{topic}".encode("utf-8")).hexdigest()[:16]
 
 
-def generate_chat_session_id():
-    return f"{int(os.times()[4] * 1000)}_{os.urandom(8).hex()}"
+class TopicIndex:
+    """
+    Per-difficulty index over the topic catalogue, built once per process.
 
+    Sessions store small topic ids instead of topic strings. An id is a hash
+    of the row's difficulty and topic, so inserting, reordering or removing
+    rows never points a stored id at a different topic. Repeated rows share
+    an id and are indexed once.
+    """
 
-async def load_chat_history(user_id: str, chat_session_id: str) -> List[dict]:
-    try:
-        doc_ref = (
-            db.collection("chatHistory")
-            .document(user_id)
-            .collection("chatSessions")
-            .document(chat_session_id)
-        )
-        doc = doc_ref.get()
-        return doc.to_dict().get("history", []) if doc.exists else []
-    except Exception as e:
-        print(f"Error loading chat history: {e}")
-        return []
+    def __init__(self, rows: List[dict]):
+        self.topics: Dict[str, str] = {}
+        self.levels: Dict[str, str] = {}
+        self.ids_by_level: Dict[str, List[str]] = {}
+        for row in rows:
+            topic_id = topic_id_for(row["Difficulty"], row["Topic"])
+            if topic_id in self.topics:
+                continue
+            self.topics[topic_id] = row["Topic"]
+            self.levels[topic_id] = row["Difficulty"]
+            self.ids_by_level.setdefault(row["Difficulty"], []).append(topic_id)
+
+    def pick_unasked(
+        self,
+        level: str,
+        asked_ids: Set[str],
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> Optional[str]:
+        """Picks a random topic id for the level that is not in asked_ids (and passes accept)."""
+        ids = self.ids_by_level.get(level, [])
+
+        def usable(topic_id: str) -> bool:
+            return topic_id not in asked_ids and (accept is None or accept(topic_id))
+
+        # Rejection sampling is O(1) on average while most topics are still usable
+        for _ in range(min(len(ids), 8)):
+            topic_id = random.choice(ids)
+            if usable(topic_id):
+                return topic_id
+
+        remaining = [topic_id for topic_id in ids if usable(topic_id)]
+        return random.choice(remaining) if remaining else None
+
+
+@lru_cache(maxsize=None)
+def get_topic_index() -> TopicIndex:
+    """Loads the topic catalogue on first use."""
+    return TopicIndex(load_csv("finance_topics_full.csv"))
 
 
-async def save_chat_history(user_id: str, chat_session_id: str, history: List[dict]):
-    try:
-        doc_ref = (
-            db.collection("chatHistory")
-            .document(user_id)
-            .collection("chatSessions")
-            .document(chat_session_id)
-        )
-        doc_ref.set({"history": history})
-    except Exception as e:
-        print(f"Error saving chat history: {e}")
+def generate_chat_session_id():
+    return f"{int(os.times()[4] * 1000)}_{os.urandom(8).hex()}"
 
 
-def history_to_types(history: List[dict]) -> List[types.Content]:
+def history_to_contents(history: List[dict]) -> List[dict]:
     return [
-        types.Content(
-            role=message["role"], parts=[types.Part.from_text(text=message["text"])]
-        )
+        {"role": message["role"], "parts": [{"text": message["text"]}]}
         for message in history
     ]
 
 
-def download_image(image_url: str) -> bytes:
-    """Downloads an image from a URL and returns it as bytes."""
-    try:
-        response = requests.get(image_url)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
-        print(f"Error downloading image: {e}")
-        raise HTTPException(
-            status_code=400, detail="Invalid image URL or failed to download."
+async def build_chat_request(
+    message: str,
+    image_url: Optional[str],
+    history: List[dict],
+    summary: Optional[str] = None,
+) -> tuple:
+    """Builds the (contents, config) for a chat message, downloading the image if given."""
+    system_instruction = FINANCIAL_SYSTEM_PROMPT
+    if summary:
+        system_instruction += f"\n\n**Summary of the earlier conversation:**\n{summary}"
+    content = history_to_contents(history) + [
+        {"role": "user", "parts": [{"text": message}]}
+    ]
+
+    if image_url:
+        image_bytes, mime_type = await load_image(image_url)
+        content[-1]["parts"].append(
+            {"inline_data": {"data": image_bytes, "mime_type": mime_type}}
         )
 
+    config = {
+        "tools": [{"google_search": {}}],
+        "response_modalities": ["TEXT"],
+        "system_instruction": system_instruction,
+    }
+    return content, config
+
 
 async def send_message_to_gemini(
-    message: str, image_url: Optional[str], history: List[dict]
+    message: str,
+    image_url: Optional[str],
+    history: List[dict],
+    summary: Optional[str] = None,
 ) -> str:
     """Sends text and image (if provided) to Gemini API."""
     try:
-        google_search_tool = Tool(google_search=GoogleSearch())
-        content = history_to_types(history) + [
-            types.Content(role="user", parts=[types.Part.from_text(text=message)])
-        ]
-
-        if image_url:
-            image_bytes = download_image(image_url)
-            content[-1].parts.append(
-                types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
-            )
-
-        response = client.models.generate_content(
-            model=MODEL,
-            config=GenerateContentConfig(
-                tools=[google_search_tool],
-                response_modalities=["TEXT"],
-                system_instruction=FINANCIAL_SYSTEM_PROMPT,
-            ),
-            contents=content,
-        )
+        content, config = await build_chat_request(message, image_url, history, summary)
+        response = await generate_content(content, config)
         return response.text
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error communicating with Gemini API: {e}")
-        raise HTTPException(
-            status_code=500, detail="Failed to communicate with Gemini API."
+        raise gemini_error(e, "Failed to communicate with Gemini API.")
+
+
+async def stream_message_from_gemini(
+    content: List[dict], config: dict
+) -> AsyncIterator[str]:
+    """Yields the reply to a request from build_chat_request as Gemini generates it."""
+    # A stream holds its gateway slot until it ends; it isn't retried or shared
+    async with gateway.slot():
+        stream = await get_genai_client().aio.models.generate_content_stream(
+            model=MODEL, config=config, contents=content
         )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
 
 
 async def send_to_gemini(prompt_text: str) -> str:
     """Sends a request to Gemini AI and returns its response."""
     try:
-        response = client.models.generate_content(
-            model=MODEL, contents=[{"role": "user", "parts": [{"text": prompt_text}]}]
+        response = await generate_content(
+            [{"role": "user", "parts": [{"text": prompt_text}]}]
         )
         return response.text.strip() if response.text else "No response received."
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Gemini API error: {e}")
-
+        raise gemini_error(e, f"Gemini API error: {e}")
 
-async def generate_unique_question(level: str, askedTopics: list) -> tuple:
-    filtered_data = [row for row in data if row["Difficulty"] == level]
 
-    if not filtered_data:
-        return "No available topics for this difficulty level.", ""
+async def generate_unique_question(
+    level: str, asked_topic_ids: Set[str], asked_questions: List[str]
+) -> tuple:
+    """Generates a question on a random unasked topic; returns (question, topic_id)."""
+    topic_index = get_topic_index()
+    if not topic_index.ids_by_level.get(level):
+        return "No available topics for this difficulty level.", None
 
-    unasked_topics = [
-        row["Topic"] for row in filtered_data if row["Topic"] not in askedTopics
-    ]
+    topic_id = topic_index.pick_unasked(level, asked_topic_ids)
+    if topic_id is None:
+        return "All available topics have been covered.", None
 
-    if not unasked_topics:
-        return "All available topics have been covered.", ""
+    question = await generate_question(
+        level, topic_index.topics[topic_id], asked_questions
+    )
+    return question, topic_id
 
-    selected_topic = random.choice(unasked_topics)
 
-    prompt_text = f"{QUESTION_PROMPT}Generate a financial quiz question related to the topic: {selected_topic}. The question should match the {level} difficulty level."
+async def generate_question(level: str, topic: str, asked_questions: List[str]) -> str:
+    """Asks Gemini for a quiz question on the given topic and difficulty level."""
+    prompt_text = f"{QUESTION_PROMPT}Generate a financial quiz question related to the topic: {topic}. The question should match the {level} difficulty level."
 
     for _ in range(5):
         new_question = await send_to_gemini(prompt_text)
-        if new_question not in askedTopics:
-            return new_question, selected_topic
+        if new_question not in asked_questions:
+            return new_question
+
+    return "No unique question could be generated."
 
-    return "No unique question could be generated.", selected_topic
+
+SCORE_SCHEMA = {
+    "type": "OBJECT",
+    "required": ["score", "explanation"],
+    "properties": {
+        "score": {"type": "INTEGER"},
+        "explanation": {"type": "STRING"},
+    },
+}
+
+# Scoring only needs a number and a sentence, so keep it short and deterministic
+SCORING_TEMPERATURE = 0.0
+SCORING_MAX_OUTPUT_TOKENS = 256
+
+
+async def send_json_to_gemini(prompt_text: str, schema: dict, **config) -> dict:
+    """Sends a prompt to Gemini with a JSON response_schema and returns the parsed reply."""
+    try:
+        response = await generate_content(
+            [{"role": "user", "parts": [{"text": prompt_text}]}],
+            {
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+                **config,
+            },
+        )
+        return json.loads(response.text)
+    except Exception as e:
+        raise gemini_error(e, f"Gemini API error: {e}")
+
+
+def clamp_score(score: int) -> int:
+    return max(0, min(int(score), 3))
 
 
 async def evaluate_answer(user_answer: str, question_topic: str, level: str) -> int:
@@ -170,11 +274,98 @@ async def evaluate_answer(user_answer: str, question_topic: str, level: str) ->
     **Difficulty Level:** {level}
     """
 
-    response_text = await send_to_gemini(prompt_text)
-    lines = response_text.split("\n")
-    score_line = next((line for line in lines if "Score:" in line), "Score: 0")
+    result = await send_json_to_gemini(
+        prompt_text,
+        SCORE_SCHEMA,
+        temperature=SCORING_TEMPERATURE,
+        max_output_tokens=SCORING_MAX_OUTPUT_TOKENS,
+    )
+    return clamp_score(result["score"])
 
-    try:
-        return int(score_line.split(":")[-1].strip())
-    except ValueError:
-        return 0  # Default score if parsing fails
+
+async def evaluate_answers_batch(items: List[dict]) -> List[dict]:
+    """
+    Scores many answers with a single Gemini call.
+
+    Each item has "question", "answer" and "level"; returns one
+    {"score", "explanation"} per item, in order.
+    """
+    answers = "\n".join(f"""
+    **Answer {index}**
+    **Question:** {item["question"]}
+    **User's Answer:** {item["answer"]}
+    **Difficulty Level:** {item["level"]}
+    """ for index, item in enumerate(items))
+    prompt_text = f"""
+    {SCORE_PROMPT}
+    Score each of the following numbered answers independently and return one
+    result per answer with its number as "index".
+    {answers}
+    """
+
+    result = await send_json_to_gemini(
+        prompt_text,
+        {
+            "type": "OBJECT",
+            "required": ["results"],
+            "properties": {
+                "results": {
+                    "type": "ARRAY",
+                    "items": {
+                        "type": "OBJECT",
+                        "required": ["index", "score", "explanation"],
+                        "properties": {
+                            "index": {"type": "INTEGER"},
+                            "score": {"type": "INTEGER"},
+                            "explanation": {"type": "STRING"},
+                        },
+                    },
+                },
+            },
+        },
+        temperature=SCORING_TEMPERATURE,
+        max_output_tokens=SCORING_MAX_OUTPUT_TOKENS * len(items),
+    )
+
+    scores = {entry["index"]: entry for entry in result["results"]}
+    if set(scores) != set(range(len(items))):
+        raise HTTPException(status_code=500, detail="Incomplete batch score result.")
+    return [
+        {
+            "score": clamp_score(scores[index]["score"]),
+            "explanation": scores[index]["explanation"],
+        }
+        for index in range(len(items))
+    ]
+
+
+async def evaluate_answer_combined(
+    user_answer: str, question_topic: str, level: str
+) -> dict:
+    """
+    Evaluates the user's answer and assigns a score in a single structured call.
+
+    Returns a dict with "evaluation", "score" and "explanation".
+    """
+    prompt_text = f"""
+    {EVALUATION_PROMPT}
+
+    **Question:** {question_topic}
+    **User's Answer:** {user_answer}
+    **Difficulty Level:** {level}
+    """
+
+    result = await send_json_to_gemini(
+        prompt_text,
+        {
+            "type": "OBJECT",
+            "required": ["evaluation", "score", "explanation"],
+            "properties": {
+                "evaluation": {"type": "STRING"},
+                "score": {"type": "INTEGER"},
+                "explanation": {"type": "STRING"},
+            },
+        },
+    )
+    result["score"] = clamp_score(result["score"])
+    return result
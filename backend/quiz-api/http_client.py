@@ -0,0 +1,48 @@
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))  # seconds
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))  # connection attempts after the first
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    # httpx only retries failed connection attempts, so retrying is safe for POSTs too
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        retries=HTTP_RETRIES,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=20,
+            keepalive_expiry=30,
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=transport, timeout=httpx.Timeout(HTTP_TIMEOUT, connect=5)
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared client, so outbound calls reuse pooled keep-alive connections."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
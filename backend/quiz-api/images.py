@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from http_client import get_http_client
+
+load_dotenv()
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1536))  # pixels
+# Decoding needs about 4 bytes per pixel, so this caps it near 100 MB per image
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 25_000_000))
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", 64 * 1024 * 1024))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", 60 * 60))  # seconds
+IMAGE_URL_CACHE_SIZE = 1024
+
+# Image types Gemini accepts as inline data
+GEMINI_MIME_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/heic",
+    "image/heif",
+}
+
+# sha256 of the downloaded bytes -> (processed bytes, MIME type)
+processed_images: "OrderedDict[str, tuple]" = OrderedDict()
+_processed_bytes = 0
+# image URL -> (fetched at, sha256 of its bytes)
+image_urls: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """Identifies an image format from its leading bytes."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:2] == b"BM":
+        return "image/bmp"
+    if data[4:8] == b"ftyp":
+        brand = data[8:12]
+        if brand in (b"heic", b"heix", b"hevc", b"hevx"):
+            return "image/heic"
+        if brand in (b"mif1", b"msf1", b"heif"):
+            return "image/heif"
+    return None
+
+
+async def _download(image_url: str) -> bytes:
+    """Streams an image into memory, giving up once it exceeds IMAGE_MAX_BYTES."""
+    too_large = HTTPException(
+        status_code=413, detail=f"Image is larger than {IMAGE_MAX_BYTES} bytes."
+    )
+    try:
+        async with get_http_client().stream(
+            "GET", image_url, follow_redirects=True
+        ) as response:
+            response.raise_for_status()
+            if int(response.headers.get("content-length", 0)) > IMAGE_MAX_BYTES:
+                raise too_large
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > IMAGE_MAX_BYTES:
+                    raise too_large
+            return bytes(data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error downloading image: {e}")
+        raise HTTPException(
+            status_code=400, detail="Invalid image URL or failed to download."
+        )
+
+
+def _reencode(data: bytes) -> tuple:
+    """Shrinks the image to IMAGE_MAX_DIMENSION and re-encodes it as JPEG or PNG."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        output = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            return output.getvalue(), "image/png"
+        image.convert("RGB").save(output, format="JPEG", quality=85)
+        return output.getvalue(), "image/jpeg"
+
+
+def _image_size(data: bytes) -> tuple:
+    """Reads the image's dimensions from its header, without decoding the pixels."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def _needs_reencode(mime_type: str, size: Optional[tuple]) -> bool:
+    if mime_type not in GEMINI_MIME_TYPES:
+        return True
+    if size is None:
+        return False  # Pillow can't decode HEIC/HEIF without a plugin
+    return max(size) > IMAGE_MAX_DIMENSION
+
+
+def _process(data: bytes) -> tuple:
+    """Returns (bytes, MIME type) ready to send to Gemini."""
+    from PIL import Image
+
+    mime_type = sniff_mime_type(data)
+    if mime_type is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format.")
+    too_many_pixels = HTTPException(
+        status_code=413, detail=f"Image has more than {IMAGE_MAX_PIXELS} pixels."
+    )
+    try:
+        size = None
+        if mime_type not in ("image/heic", "image/heif"):
+            size = _image_size(data)
+            # Checked before anything decodes it: a small compressed file can
+            # expand to hundreds of megabytes of pixels
+            if size[0] * size[1] > IMAGE_MAX_PIXELS:
+                raise too_many_pixels
+        if _needs_reencode(mime_type, size):
+            return _reencode(data)
+    except HTTPException:
+        raise
+    except Image.DecompressionBombError:
+        raise too_many_pixels
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        raise HTTPException(status_code=400, detail="Could not read the image.")
+    return data, mime_type
+
+
+def _cache_processed(digest: str, processed: tuple):
+    global _processed_bytes
+    if digest in processed_images:
+        return
+    processed_images[digest] = processed
+    _processed_bytes += len(processed[0])
+    while _processed_bytes > IMAGE_CACHE_BYTES and processed_images:
+        _, (evicted, _) = processed_images.popitem(last=False)
+        _processed_bytes -= len(evicted)
+
+
+async def load_image(image_url: str) -> tuple:
+    """
+    Returns (bytes, MIME type) for an image URL, ready to send to Gemini.
+
+    The image is streamed with a size cap, its type is sniffed from its
+    bytes, and oversized or unsupported images are downscaled and
+    re-encoded. Results are cached by URL for IMAGE_CACHE_TTL and by
+    content hash, so a follow-up about the same picture reuses them.
+    """
+    entry = image_urls.get(image_url)
+    if entry is not None and time.time() - entry[0] < IMAGE_CACHE_TTL:
+        processed = processed_images.get(entry[1])
+        if processed is not None:
+            image_urls.move_to_end(image_url)
+            processed_images.move_to_end(entry[1])
+            return processed
+
+    data = await _download(image_url)
+    digest = hashlib.sha256(data).hexdigest()
+    processed = processed_images.get(digest)
+    if processed is None:
+        processed = await run_in_threadpool(_process, data)
+        _cache_processed(digest, processed)
+
+    image_urls[image_url] = (time.time(), digest)
+    image_urls.move_to_end(image_url)
+    while len(image_urls) > IMAGE_URL_CACHE_SIZE:
+        image_urls.popitem(last=False)
+    return processed
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_RATE_LIMIT = float(os.getenv("GEMINI_RATE_LIMIT", 10))  # requests per second
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", 20))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_BASE = 0.5  # seconds
+GEMINI_BACKOFF_MAX = 20.0  # seconds
+
+# Status codes worth retrying: quota exhaustion and transient server errors
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+def error_code(error: Exception) -> Optional[int]:
+    # google.genai's APIError carries the HTTP status as .code
+    return getattr(error, "code", None)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return error_code(error) == 429
+
+
+def request_key(*parts: Any) -> str:
+    """Hashes the parts of a Gemini request, so identical requests share a key."""
+
+    def default(value):
+        if isinstance(value, bytes):
+            return hashlib.sha256(value).hexdigest()
+        return str(value)
+
+    return hashlib.sha256(
+        json.dumps(parts, default=default, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Holds back every caller, e.g. after the API reports its quota is exhausted."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class LLMGateway:
+    """
+    Funnels every Gemini call in the process through one concurrency limit
+    and rate limit.
+
+    Failed calls are retried with jittered exponential backoff, and a 429
+    pauses all callers rather than just the one that hit it. Calls made
+    with the same key while one is already in flight share its result.
+    """
+
+    def __init__(self, max_concurrency: int, rate: float, burst: int, retries: int):
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._waits: deque = deque(maxlen=1000)  # seconds from queued to running
+        self.queued = 0
+        self.running = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for a concurrency slot and a rate-limit token, recording the wait."""
+        self.queued += 1
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            await self._bucket.acquire()
+            self._waits.append(time.monotonic() - queued_at)
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+        finally:
+            self._semaphore.release()
+
+    async def _call_with_retries(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.slot():
+                    return await fn()
+            except Exception as e:
+                if attempt == self.retries or error_code(e) not in RETRYABLE_CODES:
+                    self.failed += 1
+                    raise
+                delay = random.uniform(
+                    0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2**attempt)
+                )
+                if is_rate_limited(e):
+                    self._bucket.pause(delay)
+                self.retried += 1
+                await asyncio.sleep(delay)
+
+    async def call(
+        self, fn: Callable[[], Awaitable[Any]], key: Optional[str] = None
+    ) -> Any:
+        """Runs fn, a coroutine function making one Gemini request, under the limits."""
+        if key is None:
+            return await self._call_with_retries(fn)
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so one caller disconnecting doesn't cancel the others' result
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._call_with_retries(fn))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # Every waiter may have gone; don't log it as unhandled
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "queueDepth": self.queued,
+            "running": self.running,
+            "inFlightKeys": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "waitSeconds": {
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+
+
+gateway = LLMGateway(
+    GEMINI_MAX_CONCURRENCY, GEMINI_RATE_LIMIT, GEMINI_BURST, GEMINI_MAX_RETRIES
+)
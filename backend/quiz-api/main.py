@@ -1,29 +1,40 @@
+import asyncio
+import json
 import logging
 import os
 import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
 
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from firebase_admin import firestore
+from fastapi.responses import StreamingResponse
 
 from auth import (
     authenticate_with_firebase,
-    db,
+    get_db,
     get_firebase_user,
     refresh_firebase_token,
+    stop_signing_key_refresh,
 )
+from chat_history import append_chat_messages, context_window, get_chat_session
 from functions import (
+    build_chat_request,
     evaluate_answer,
-    generate_unique_question,
-    load_chat_history,
-    save_chat_history,
+    evaluate_answer_combined,
+    evaluate_answers_batch,
     send_message_to_gemini,
     send_to_gemini,
+    stream_message_from_gemini,
+    get_topic_index,
 )
+from http_client import close_http_client, get_http_client
+from llm_gateway import gateway
 from models import (
     AnswerRequest,
+    BatchScoreRequest,
     ChatRequestImage,
     LoginRequest,
     Portfolio,
@@ -31,10 +42,22 @@ from models import (
     StartRequest,
 )
 from prompts import FINANCIAL_SYSTEM_PROMPT
+from question_pool import get_pooled_question
 
 load_dotenv()
 
-app = FastAPI()
+MAX_PROGRESS_PAGE = 100
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_http_client()
+    yield
+    stop_signing_key_refresh()
+    await close_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,10 +76,10 @@ async def root():
 @app.post("/v1/profile")
 async def portfolio(request: Portfolio, user_data: dict = Depends(get_firebase_user)):
     user_id = user_data.get("uid")
-    user_ref = db.collection("profile").document(user_id)
+    user_ref = get_db().collection("profile").document(user_id)
 
     # Create the user's profile
-    user_ref.set(
+    await user_ref.set(
         {
             "Name": request.name,
             "Age": request.age,
@@ -73,7 +96,7 @@ async def portfolio(request: Portfolio, user_data: dict = Depends(get_firebase_u
         merge=True,
     )
     # Fetch the updated profile to return
-    updated_profile = user_ref.get().to_dict()
+    updated_profile = (await user_ref.get()).to_dict()
 
     return {"message": "Profile successfully created.", "profile": updated_profile}
 
@@ -83,7 +106,7 @@ async def update_portfolio(
     request: Portfolio, user_data: dict = Depends(get_firebase_user)
 ):
     user_id = user_data.get("uid")
-    user_ref = db.collection("profile").document(user_id)
+    user_ref = get_db().collection("profile").document(user_id)
 
     # Prepare the update data, skipping None values
     update_data = {
@@ -104,10 +127,10 @@ async def update_portfolio(
     update_data = {k: v for k, v in update_data.items() if v is not None}
 
     # Update the user's profile
-    user_ref.update(update_data)
+    await user_ref.update(update_data)
 
     # Fetch the updated profile to return
-    updated_profile = user_ref.get().to_dict()
+    updated_profile = (await user_ref.get()).to_dict()
 
     return {"message": "Profile successfully updated.", "profile": updated_profile}
 
@@ -134,22 +157,23 @@ async def start_quiz(
     session_id = str(uuid.uuid4())
     user_id = user_data.get("uid")
 
-    generated_question, topic = await generate_unique_question(request.level, [])
+    generated_question, topic_id = await get_pooled_question(request.level, set(), [])
 
     session_data = {
         "userId": user_id,
         "sessionId": session_id,
         "level": request.level,
-        "history": [],
+        "answerCount": 0,
         "askedQuestions": [generated_question],
-        "askedTopics": [topic],
+        "askedTopicIds": [] if topic_id is None else [topic_id],
+        "currentTopicId": topic_id,
         "currentQuestion": {"Topic": generated_question},
         "score": 0,
     }
     # change it to a user profile
-    db.collection("quiz_sessions").document(user_id).collection("sessions").document(
-        session_id
-    ).set(session_data)
+    await get_db().collection("quiz_sessions").document(user_id).collection(
+        "sessions"
+    ).document(session_id).set(session_data)
     # # Store asked question separately under userId -> askedQuestions
     # question_ref = db.collection("Topics").document("AskedTopics")
     # question_ref.set({"Topics": firestore.ArrayUnion([{"Topic": topic}])}, merge=True)
@@ -172,63 +196,58 @@ async def answer_question(
         dict: A JSON response containing the evaluation of the current answer, the next question, and the updated score.
 
     Raises:
-        HTTPException: If the session does not exist.
+        HTTPException: If the session does not exist, or 409 if the question was
+        answered by another request in the meantime.
     """
+    # Imported here so routes that never write scores don't load Firestore
+    from firebase_admin import firestore
+
     uuid_user = user_data.get("uid")
     session_ref = (
-        db.collection("quiz_sessions")
+        get_db()
+        .collection("quiz_sessions")
         .document(uuid_user)
         .collection("sessions")
         .document(request.sessionId)
     )
-    session_doc = session_ref.get()
+    session_doc = await session_ref.get()
 
     if not session_doc.exists:
         raise HTTPException(status_code=400, detail="No active session found!")
 
     session = session_doc.to_dict()
     question = session["currentQuestion"]["Topic"]
-    topic = session["askedTopics"]
     level = session["level"]
-
-    evaluation = await send_to_gemini(
-        f"Evaluate: {question}\nUser's answer: {request.answer}"
+    topic_id = session.get("currentTopicId")
+    # Topics removed from the catalogue, and the row numbers that older
+    # sessions stored as ids, are unknown and simply not recorded as known
+    topic = get_topic_index().topics.get(topic_id)
+    asked_topic_ids = set(session.get("askedTopicIds", []))
+
+    # The evaluation, the score and the next question don't depend on each other
+    next_question = get_pooled_question(
+        level, asked_topic_ids, session["askedQuestions"]
     )
-    score = await evaluate_answer(request.answer, question, level)
-
-    # Update the Topics if it is known by user.
-    if score > 0 and level == "Beginner":
-        session["score"] += score
-        # Store the topic if the answer is correct
-        question_ref = db.collection("topics").document("AskedTopics")
-        question_ref.set(
-            {"Topics": firestore.ArrayUnion([{"Topic": topic}])}, merge=True
+    explanation = None
+    if request.combined:
+        result, (new_question, new_topic_id) = await asyncio.gather(
+            evaluate_answer_combined(request.answer, question, level), next_question
         )
-    if score > 0 and level == "Intermediate":
-        session["score"] += score
-        question_ref = db.collection("topics").document("AskedTopics")
-        question_ref.set(
-            {"Topics": firestore.ArrayUnion([{"Topic": topic}])}, merge=True
-        )
-    if score > 1 and level == "Advanced":
-        session["score"] += score
-        question_ref = db.collection("topics").document("AskedTopics")
-        question_ref.set(
-            {"Topics": firestore.ArrayUnion([{"Topic": topic}])}, merge=True
+        evaluation = result["evaluation"]
+        score = result["score"]
+        explanation = result["explanation"]
+    else:
+        evaluation, score, (new_question, new_topic_id) = await asyncio.gather(
+            send_to_gemini(f"Evaluate: {question}\nUser's answer: {request.answer}"),
+            evaluate_answer(request.answer, question, level),
+            next_question,
         )
-    if score == 1 and level == "Advanced":
-        session["score"] += score
 
-    history_entry = {
-        "question": question,
-        "userAnswer": request.answer,
-        "evaluation": evaluation,
-        "score": score,
-    }
-
-    # Update the user's total score
-    total_score_ref = db.collection("experiencePoints").document(uuid_user)
-    total_score_doc = total_score_ref.get()
+    # Update the Topics if it is known by user.
+    if level == "Advanced":
+        topic_known = score > 1
+    else:
+        topic_known = score > 0
 
     # Adjust the score multiplier based on the difficulty level
     if level == "Beginner":
@@ -243,53 +262,138 @@ async def answer_question(
     # Multiply the score before storing
     calculated_score = score * score_multiplier
 
-    if total_score_doc.exists:
-        total_score_data = total_score_doc.to_dict()
-        new_total_score = total_score_data.get("score", 0) + calculated_score
-    else:
-        new_total_score = calculated_score
-
-    total_score_ref.set({"score": new_total_score}, merge=True)
-
-    new_question, new_topic = await generate_unique_question(
-        level, session.get("askedTopics", [])
-    )
-
-    session["currentQuestion"] = {"Topic": new_question}
-    session["askedQuestions"].append(new_question)
-    session["history"].append(history_entry)
-    session["askedTopics"] = new_topic
-
     # question_ref = db.collection("Topics").document("AskedTopics")
     # question_ref.set({"Topics": firestore.ArrayUnion([{"Topic": new_topic}])}, merge=True)
 
-    session_ref.set(session, merge=True)
+    @firestore.async_transactional
+    async def record_answer(transaction):
+        # Re-read inside the transaction: if another request answered this
+        # question while Gemini was grading, the answer is stale
+        current = (await session_ref.get(transaction=transaction)).to_dict()
+        if current["currentQuestion"]["Topic"] != question:
+            raise HTTPException(
+                status_code=409, detail="This question has already been answered."
+            )
+
+        # Sessions started before history moved to its own subcollection keep
+        # their first entries inline, so numbering continues after them
+        answer_index = current.get("answerCount", len(current.get("history", [])))
+        history_entry = {
+            "index": answer_index,
+            "question": question,
+            "userAnswer": request.answer,
+            "evaluation": evaluation,
+            "score": score,
+        }
+        # Only the fields that changed are written, so the cost of an answer
+        # doesn't grow with the length of the session
+        session_update = {
+            "currentQuestion": {"Topic": new_question},
+            "currentTopicId": new_topic_id,
+            "askedQuestions": firestore.ArrayUnion([new_question]),
+            "answerCount": answer_index + 1,
+            "score": firestore.Increment(score),
+        }
+        if new_topic_id is not None:
+            session_update["askedTopicIds"] = firestore.ArrayUnion([new_topic_id])
+
+        if topic_known and topic is not None:
+            # Store the topic if the answer is correct
+            question_ref = get_db().collection("topics").document("AskedTopics")
+            transaction.set(
+                question_ref,
+                {"Topics": firestore.ArrayUnion([{"Topic": topic}])},
+                merge=True,
+            )
+        total_score_ref = get_db().collection("experiencePoints").document(uuid_user)
+        transaction.set(
+            total_score_ref,
+            {"score": firestore.Increment(calculated_score)},
+            merge=True,
+        )
+        # The index doubles as the document id, so an answer can't be recorded twice
+        transaction.create(
+            session_ref.collection("history").document(str(answer_index)),
+            history_entry,
+        )
+        transaction.set(session_ref, session_update, merge=True)
+        return current["score"] + score
+
+    # Every write for this answer commits together, and only if the question
+    # is still the current one
+    current_score = await record_answer(get_db().transaction())
 
-    return {
+    response = {
         "evaluation": evaluation,
         "nextQuestion": new_question,
-        "currentScore": session["score"],
+        "currentScore": current_score,
     }
+    if explanation is not None:
+        response["explanation"] = explanation
+    return response
+
+
+@app.post("/v1/score/batch")
+async def score_batch(
+    request: BatchScoreRequest, user_data: dict = Depends(get_firebase_user)
+):
+    """Grades many answers with a single Gemini call, e.g. for a whole class."""
+    results = await evaluate_answers_batch(
+        [item.model_dump() for item in request.items]
+    )
+    return {"results": results}
 
 
 @app.get("/v1/progress/{sessionId}")
-async def get_progress(sessionId: str, user_data: dict = Depends(get_firebase_user)):
+async def get_progress(
+    sessionId: str,
+    limit: int = Query(50, ge=1, le=MAX_PROGRESS_PAGE),
+    cursor: Optional[int] = Query(None, ge=0),
+    user_data: dict = Depends(get_firebase_user),
+):
+    """
+    Returns a session's score and one page of its answer history.
+
+    Pass the returned `nextCursor` as `cursor` to fetch the following page;
+    it is null once the history has been read to the end.
+    """
     userId = user_data.get("uid")
     session_ref = (
-        db.collection("quiz_sessions")
+        get_db()
+        .collection("quiz_sessions")
         .document(userId)
         .collection("sessions")
         .document(sessionId)
     )
-    session_doc = session_ref.get()
+    session_doc = await session_ref.get()
 
     if not session_doc.exists:
         raise HTTPException(status_code=400, detail="No active session found")
 
     session_data = session_doc.to_dict()
+    start = 0 if cursor is None else cursor + 1
+
+    # Older sessions stored their history inline on the session document
+    inline = session_data.get("history", [])
+    history = [
+        {"index": index, **entry}
+        for index, entry in enumerate(inline)
+        if start <= index < start + limit
+    ]
+
+    if len(history) < limit:
+        # answer_question assigns each index once, in a transaction, so the
+        # index is a safe cursor
+        query = session_ref.collection("history").order_by("index")
+        if cursor is not None:
+            query = query.start_after({"index": cursor})
+        query = query.limit(limit - len(history))
+        history += [doc.to_dict() async for doc in query.stream()]
+
     return {
-        "history": session_data.get("history", []),
+        "history": history,
         "score": session_data.get("score", 0),
+        "nextCursor": history[-1]["index"] if len(history) == limit else None,
     }
 
 
@@ -298,22 +402,83 @@ async def chat(request: ChatRequestImage, user_data: dict = Depends(get_firebase
     chat_session_id = request.chatSessionId or str(uuid.uuid4())
     user_id = user_data.get("uid")
 
-    history = await load_chat_history(user_id, chat_session_id)
-    response = await send_message_to_gemini(request.message, request.imageUrl, history)
+    session = await get_chat_session(user_id, chat_session_id)
+    summary, history = context_window(session)
+    response = await send_message_to_gemini(
+        request.message, request.imageUrl, history, summary
+    )
 
-    new_history = history + [
-        {"role": "user", "text": request.message, "image": request.imageUrl},
-        {"role": "model", "text": response},
-    ]
-    await save_chat_history(user_id, chat_session_id, new_history)
+    await append_chat_messages(
+        user_id,
+        chat_session_id,
+        session,
+        [
+            {"role": "user", "text": request.message, "image": request.imageUrl},
+            {"role": "model", "text": response},
+        ],
+    )
 
     return {"reply": response, "chatSessionId": chat_session_id}
 
 
+@app.post("/v1/chatwithimage/stream")
+async def chat_stream(
+    request: ChatRequestImage, user_data: dict = Depends(get_firebase_user)
+):
+    """
+    Streams the chat reply as server-sent events while Gemini generates it.
+
+    Each `message` event carries a chunk of text, then a final `done` event
+    carries the chatSessionId (or `error` if generation failed). The
+    exchange is saved to the chat history once the reply is complete.
+    """
+    chat_session_id = request.chatSessionId or str(uuid.uuid4())
+    user_id = user_data.get("uid")
+
+    session = await get_chat_session(user_id, chat_session_id)
+    summary, history = context_window(session)
+    # Built before streaming starts so a bad image URL is still a 400
+    content, config = await build_chat_request(
+        request.message, request.imageUrl, history, summary
+    )
+
+    async def events():
+        chunks = []
+        try:
+            async for text in stream_message_from_gemini(content, config):
+                chunks.append(text)
+                yield f"data: {json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            print(f"Error communicating with Gemini API: {e}")
+            error = {"detail": "Failed to communicate with Gemini API."}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+
+        await append_chat_messages(
+            user_id,
+            chat_session_id,
+            session,
+            [
+                {"role": "user", "text": request.message, "image": request.imageUrl},
+                {"role": "model", "text": "".join(chunks)},
+            ],
+        )
+        done = {"chatSessionId": chat_session_id}
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/v1/login")
-def login(request_data: LoginRequest):
+async def login(request_data: LoginRequest):
     try:
-        result = authenticate_with_firebase(request_data.email, request_data.password)
+        result = await authenticate_with_firebase(
+            request_data.email, request_data.password
+        )
         return {
             "id_token": result.get("idToken"),
             "refresh_token": result.get("refreshToken"),
@@ -325,9 +490,9 @@ def login(request_data: LoginRequest):
 
 
 @app.post("/v1/refresh")
-def refresh_token(request_data: RefreshRequest):
+async def refresh_token(request_data: RefreshRequest):
     try:
-        result = refresh_firebase_token(request_data.refresh_token)
+        result = await refresh_firebase_token(request_data.refresh_token)
         return {
             "id_token": result.get("id_token"),
             "refresh_token": result.get("refresh_token"),
@@ -338,6 +503,12 @@ def refresh_token(request_data: RefreshRequest):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@app.get("/v1/llm-metrics")
+async def llm_metrics(user_data: dict = Depends(get_firebase_user)):
+    """Reports the Gemini gateway's queue depth, wait times and retry counts."""
+    return gateway.metrics()
+
+
 @app.get("/v1/protected-route")
 def protected_route(user_data: dict = Depends(get_firebase_user)):
     return {"message": "Welcome to the protected route!", "user_data": user_data}
@@ -1,6 +1,6 @@
 from typing import Optional, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ChatRequestImage(BaseModel):
@@ -19,6 +19,18 @@ class AnswerRequest(BaseModel):
     # userId: str
     sessionId: str
     answer: str
+    # Evaluate and score the answer with a single structured Gemini call
+    combined: bool = False
+
+
+class ScoreItem(BaseModel):
+    question: str
+    answer: str
+    level: Literal["Beginner", "Intermediate", "Advanced"]
+
+
+class BatchScoreRequest(BaseModel):
+    items: list[ScoreItem] = Field(min_length=1, max_length=50)
 
 
 class LoginRequest(BaseModel):
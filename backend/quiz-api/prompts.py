@@ -20,13 +20,8 @@ You are evaluating a financial quiz answer based on accuracy.
 - Advanced: 3 points for correct, 2 points for partial, 0 for incorrect.
 
 **Instructions:**
-- Provide a score (0, 1, 2, or 3) based on the difficulty level.
-- Explain briefly why the score was assigned.
-
-**Format:**
-Score: X
-Explanation: Y
-Reason: (Keep it Brief)
+- In "score", provide a score (0, 1, 2, or 3) based on the difficulty level.
+- In "explanation", explain briefly why the score was assigned (one or two sentences).
 """
 
 FINANCIAL_SYSTEM_PROMPT = """
@@ -71,6 +66,27 @@ For any request regarding a specific publicly traded company or stock, you MUST
 
 **Execution:** Execute requests accurately based *only* on the instructions above. Do not infer requirements beyond what is explicitly stated.
 """
+EVALUATION_PROMPT = """
+You are evaluating a financial quiz answer based on accuracy.
+
+**Scoring Criteria:**
+- Beginner: 1 point for correct, 1 point for partial, 0 for incorrect.
+- Intermediate: 2 points for correct, 1 point for partial, 0 for incorrect.
+- Advanced: 3 points for correct, 2 points for partial, 0 for incorrect.
+
+**Instructions:**
+- In "evaluation", give the user feedback on their answer and explain the correct answer.
+- In "score", give the score (0, 1, 2, or 3) based on the difficulty level.
+- In "explanation", explain briefly why the score was assigned.
+"""
+CHAT_SUMMARY_PROMPT = """
+You are maintaining a running summary of a conversation between a user and a financial assistant.
+
+**Instructions:**
+- Merge the new messages into the current summary.
+- Keep facts, figures, tickers, and the user's goals and preferences that later answers may rely on.
+- Return only the updated summary, in at most 200 words.
+"""
 QUESTION_PROMPT = """
 **Instructions:**
 - Do NOT repeat any previously asked questions.
@@ -0,0 +1,149 @@
+import asyncio
+import os
+from typing import Dict, List, Set
+
+from auth import get_db
+from background import spawn
+from functions import (
+    generate_question,
+    generate_unique_question,
+    get_topic_index,
+    topic_id_for,
+)
+
+QUESTION_POOL_SIZE = int(os.getenv("QUESTION_POOL_SIZE", 2))  # questions per topic
+QUESTION_POOL_CONCURRENCY = int(os.getenv("QUESTION_POOL_CONCURRENCY", 2))
+# Short topics of the requested level topped up per request, besides the one served
+QUESTION_POOL_REFILL_TOPICS = int(os.getenv("QUESTION_POOL_REFILL_TOPICS", 2))
+
+# topic id -> pooled questions, each {"id": Firestore doc id, "question": text}
+question_pool: Dict[str, List[dict]] = {}
+_loaded_levels: Set[str] = set()
+_pool_lock = asyncio.Lock()
+_refilling: Set[str] = set()
+_refill_semaphore = asyncio.Semaphore(QUESTION_POOL_CONCURRENCY)
+
+
+async def load_level(level: str):
+    """Loads the durable pool for one difficulty level from Firestore, once per process."""
+    if level in _loaded_levels:
+        return
+    async with _pool_lock:
+        if level in _loaded_levels:
+            return
+        from google.cloud.firestore_v1 import FieldFilter
+
+        topic_index = get_topic_index()
+        query = (
+            get_db()
+            .collection("questionPool")
+            .where(filter=FieldFilter("level", "==", level))
+        )
+        try:
+            async for doc in query.stream():
+                entry = doc.to_dict()
+                # Docs stored before topicId was added get the id it would have had
+                topic_id = entry.get("topicId") or topic_id_for(
+                    entry["level"], entry["topic"]
+                )
+                if topic_id not in topic_index.topics:
+                    continue  # Topic was removed from the catalogue
+                question_pool.setdefault(topic_id, []).append(
+                    {"id": doc.id, "question": entry["question"]}
+                )
+        except Exception as e:
+            print(f"Error loading question pool: {e}")
+        _loaded_levels.add(level)
+
+
+def _needs_refill(topic_id: str) -> bool:
+    return (
+        topic_id not in _refilling
+        and len(question_pool.get(topic_id, [])) < QUESTION_POOL_SIZE
+    )
+
+
+def schedule_refill(topic_id: str):
+    if not _needs_refill(topic_id):
+        return
+    _refilling.add(topic_id)
+    spawn(refill(topic_id))
+
+
+def refill_level(level: str):
+    """
+    Tops up a few short topics of the level, so the pool fills as the level is
+    played rather than for the whole catalogue at once.
+    """
+    topic_index = get_topic_index()
+    for _ in range(QUESTION_POOL_REFILL_TOPICS):
+        topic_id = topic_index.pick_unasked(level, set(), accept=_needs_refill)
+        if topic_id is None:
+            return
+        schedule_refill(topic_id)
+
+
+async def refill(topic_id: str):
+    """Generates questions for a topic until its buffer is full and stores them durably."""
+    topic_index = get_topic_index()
+    level = topic_index.levels[topic_id]
+    topic = topic_index.topics[topic_id]
+    try:
+        async with _refill_semaphore:
+            while len(question_pool.get(topic_id, [])) < QUESTION_POOL_SIZE:
+                question = await generate_question(level, topic, [])
+                doc_ref = get_db().collection("questionPool").document()
+                await doc_ref.set(
+                    {
+                        "topicId": topic_id,
+                        "level": level,
+                        "topic": topic,
+                        "question": question,
+                    }
+                )
+                question_pool.setdefault(topic_id, []).append(
+                    {"id": doc_ref.id, "question": question}
+                )
+    except Exception as e:
+        print(f"Error refilling question pool for {topic}: {e}")
+    finally:
+        _refilling.discard(topic_id)
+
+
+async def _delete_pooled(doc_id: str):
+    try:
+        await get_db().collection("questionPool").document(doc_id).delete()
+    except Exception as e:
+        print(f"Error removing pooled question: {e}")
+
+
+async def get_pooled_question(
+    level: str, asked_topic_ids: Set[str], asked_questions: List[str]
+) -> tuple:
+    """
+    Serves a question on an unasked topic from the pre-generated pool.
+
+    Returns (question, topic_id) like generate_unique_question, which is
+    used as a fallback when no unasked topic has a pooled question. Taken
+    questions, and a few other short topics of the level, are refilled in
+    the background.
+    """
+    if QUESTION_POOL_SIZE <= 0:
+        return await generate_unique_question(level, asked_topic_ids, asked_questions)
+
+    await load_level(level)
+    topic_id = get_topic_index().pick_unasked(
+        level,
+        asked_topic_ids,
+        accept=lambda candidate: bool(question_pool.get(candidate)),
+    )
+    if topic_id is None:
+        result = await generate_unique_question(level, asked_topic_ids, asked_questions)
+    else:
+        entry = question_pool[topic_id].pop()
+        spawn(_delete_pooled(entry["id"]))
+        schedule_refill(topic_id)
+        result = entry["question"], topic_id
+
+    refill_level(level)
+    return result
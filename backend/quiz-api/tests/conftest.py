@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+
+import auth
+import functions
+import main
+import question_pool
+from llm_gateway import LLMGateway
+from tests.fakes import FakeFirestore, FakeGemini
+
+USER_ID = "user-1"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(auth, "_db", fake)
+    return fake
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    fake = FakeGemini()
+    monkeypatch.setattr(functions, "get_genai_client", lambda: fake)
+    monkeypatch.setattr(question_pool, "QUESTION_POOL_SIZE", 0)
+    # A fresh gateway per test, since each test runs its own event loop
+    monkeypatch.setattr(functions, "gateway", LLMGateway(8, 1000, 1000, 0))
+    return fake
+
+
+@pytest.fixture
+def pool(monkeypatch, gemini):
+    """Turns the question pool on, with empty per-process state for this test's loop."""
+    monkeypatch.setattr(question_pool, "QUESTION_POOL_SIZE", 2)
+    monkeypatch.setattr(question_pool, "question_pool", {})
+    monkeypatch.setattr(question_pool, "_loaded_levels", set())
+    monkeypatch.setattr(question_pool, "_refilling", set())
+    monkeypatch.setattr(question_pool, "_pool_lock", asyncio.Lock())
+    monkeypatch.setattr(question_pool, "_refill_semaphore", asyncio.Semaphore(2))
+    return question_pool
+
+
+@pytest.fixture
+def api(db, gemini):
+    """Runs a coroutine function against the app with a signed-in user."""
+
+    async def user():
+        return {"uid": USER_ID}
+
+    main.app.dependency_overrides[auth.get_firebase_user] = user
+
+    def run(test):
+        async def session():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await test(client)
+
+        return asyncio.run(session())
+
+    yield run
+    main.app.dependency_overrides.clear()
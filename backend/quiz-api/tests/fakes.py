@@ -0,0 +1,233 @@
+"""In-memory stand-ins for the async Firestore client and Gemini."""
+
+import asyncio
+import copy
+import itertools
+import types
+import uuid
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+
+
+def _apply(current, data, merge):
+    document = copy.deepcopy(current) if merge and current else {}
+    for field, value in data.items():
+        if isinstance(value, transforms.Increment):
+            document[field] = document.get(field, 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            items = list(document.get(field, []))
+            items += [item for item in value.values if item not in items]
+            document[field] = items
+        else:
+            document[field] = copy.deepcopy(value)
+    return document
+
+
+class Snapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class DocumentReference:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return CollectionReference(self._db, self.path + (name,))
+
+    async def get(self, transaction=None):
+        self._db.round_trips.append(("get", self.path))
+        await asyncio.sleep(0)
+        if transaction is not None:
+            transaction._reads[self.path] = self._db.versions.get(self.path, 0)
+        return Snapshot(self, self._db.documents.get(self.path))
+
+    async def set(self, data, merge=False):
+        self._db.round_trips.append(("set", self.path))
+        await asyncio.sleep(0)
+        self._db._write(self.path, data, merge)
+
+    async def update(self, data):
+        self._db.round_trips.append(("update", self.path))
+        await asyncio.sleep(0)
+        if self.path not in self._db.documents:
+            raise exceptions.NotFound("/".join(self.path))
+        self._db._write(self.path, data, merge=True)
+
+    async def delete(self):
+        self._db.round_trips.append(("delete", self.path))
+        await asyncio.sleep(0)
+        self._db.documents.pop(self.path, None)
+
+
+class Query:
+    def __init__(self, db, path, filters=(), order=None, after=None, count=None):
+        self._db = db
+        self._path = path
+        self._filters = filters
+        self._order = order
+        self._after = after
+        self._count = count
+
+    def _copy(self, **changes):
+        fields = {
+            "filters": self._filters,
+            "order": self._order,
+            "after": self._after,
+            "count": self._count,
+            **changes,
+        }
+        return Query(self._db, self._path, **fields)
+
+    def where(self, filter):
+        assert filter.op_string == "==", "only equality filters are faked"
+        return self._copy(filters=self._filters + ((filter.field_path, filter.value),))
+
+    def order_by(self, field):
+        return self._copy(order=field)
+
+    def start_after(self, values):
+        return self._copy(after=values[self._order])
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    async def stream(self):
+        self._db.round_trips.append(("query", self._path))
+        await asyncio.sleep(0)
+        matches = [
+            (path, data)
+            for path, data in self._db.documents.items()
+            if path[:-1] == self._path
+            and all(data.get(field) == value for field, value in self._filters)
+        ]
+        if self._order is not None:
+            matches.sort(key=lambda match: match[1][self._order])
+            if self._after is not None:
+                matches = [m for m in matches if m[1][self._order] > self._after]
+        if self._count is not None:
+            matches = matches[: self._count]
+        for path, data in matches:
+            yield Snapshot(DocumentReference(self._db, path), copy.deepcopy(data))
+
+
+class CollectionReference(Query):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+
+    def document(self, document_id=None):
+        return DocumentReference(
+            self._db, self._path + (document_id or uuid.uuid4().hex,)
+        )
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(("set", reference.path, data, merge))
+
+    def create(self, reference, data):
+        self._writes.append(("create", reference.path, data, False))
+
+    async def commit(self):
+        self._db.round_trips.append(("commit", len(self._writes)))
+        await asyncio.sleep(0)
+        self._db._commit(self._writes)
+
+
+class Transaction(WriteBatch):
+    """Optimistic transaction: commit aborts if a document it read has changed."""
+
+    _max_attempts = 5
+    _read_only = False
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._id = None
+        self._reads = {}
+
+    def _clean_up(self):
+        self._id = None
+        self._reads = {}
+        self._writes = []
+
+    async def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    async def _rollback(self):
+        self._clean_up()
+
+    async def _commit(self):
+        self._db.round_trips.append(("commit", len(self._writes)))
+        await asyncio.sleep(0)
+        for path, version in self._reads.items():
+            if self._db.versions.get(path, 0) != version:
+                raise exceptions.Aborted(f"{'/'.join(path)} changed")
+        self._db._commit(self._writes)
+        self._clean_up()
+        return []
+
+
+class FakeFirestore:
+    """
+    Keeps documents in a dict keyed by path and records every call that
+    would be a network round trip in round_trips.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.versions = {}
+        self.round_trips = []
+
+    def collection(self, name):
+        return CollectionReference(self, (name,))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self):
+        return Transaction(self)
+
+    def _write(self, path, data, merge):
+        self.documents[path] = _apply(self.documents.get(path), data, merge)
+        self.versions[path] = self.versions.get(path, 0) + 1
+
+    def _commit(self, writes):
+        # Check every create before applying anything, so a commit is all or nothing
+        for kind, path, _, _ in writes:
+            if kind == "create" and path in self.documents:
+                raise exceptions.AlreadyExists("/".join(path))
+        for _, path, data, merge in writes:
+            self._write(path, data, merge)
+
+
+class FakeGemini:
+    """Answers every prompt with a new question, and every scoring request with `score`."""
+
+    def __init__(self, score=2, latency=0.01):
+        self.score = score
+        self.latency = latency
+        self.calls = 0
+        self._numbers = itertools.count(1)
+        self.aio = types.SimpleNamespace(models=self)
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if config and "response_schema" in config:
+            text = f'{{"score": {self.score}, "explanation": "Graded."}}'
+        else:
+            text = f"Question {next(self._numbers)}?"
+        return types.SimpleNamespace(text=text)
@@ -0,0 +1,79 @@
+import asyncio
+
+from tests.conftest import USER_ID
+
+
+def session_path(session_id):
+    return ("quiz_sessions", USER_ID, "sessions", session_id)
+
+
+def history_docs(db, session_id):
+    prefix = session_path(session_id) + ("history",)
+    return [data for path, data in db.documents.items() if path[:-1] == prefix]
+
+
+async def start(client, level="Advanced"):
+    response = await client.post("/v1/start", json={"level": level})
+    assert response.status_code == 200
+    return response.json()["sessionId"]
+
+
+def test_answer_reads_once_and_commits_once(api, db):
+    async def test(client):
+        session_id = await start(client)
+        db.round_trips.clear()
+        response = await client.post(
+            "/v1/answer", json={"sessionId": session_id, "answer": "Diversify."}
+        )
+        assert response.status_code == 200
+        return session_id
+
+    session_id = api(test)
+
+    # One read to grade the answer, one inside the transaction, one commit
+    assert [kind for kind, _ in db.round_trips] == ["get", "get", "commit"]
+    session = db.documents[session_path(session_id)]
+    assert session["score"] == 2
+    assert session["answerCount"] == 1
+    assert db.documents[("experiencePoints", USER_ID)]["score"] == 2 * 500
+
+
+def test_concurrent_answers_to_one_question_score_once(api, db):
+    async def test(client):
+        session_id = await start(client)
+        responses = await asyncio.gather(
+            *[
+                client.post(
+                    "/v1/answer", json={"sessionId": session_id, "answer": "Bonds."}
+                )
+                for _ in range(5)
+            ]
+        )
+        return session_id, sorted(response.status_code for response in responses)
+
+    session_id, statuses = api(test)
+
+    assert statuses == [200, 409, 409, 409, 409]
+    session = db.documents[session_path(session_id)]
+    assert session["score"] == 2
+    assert session["answerCount"] == 1
+    assert db.documents[("experiencePoints", USER_ID)]["score"] == 2 * 500
+    assert [entry["index"] for entry in history_docs(db, session_id)] == [0]
+
+
+def test_answers_in_turn_get_unique_indexes(api, db):
+    async def test(client):
+        session_id = await start(client, level="Beginner")
+        for _ in range(3):
+            response = await client.post(
+                "/v1/answer", json={"sessionId": session_id, "answer": "Stocks."}
+            )
+            assert response.status_code == 200
+        return session_id, response.json()
+
+    session_id, last = api(test)
+
+    assert last["currentScore"] == 3 * 2
+    assert sorted(e["index"] for e in history_docs(db, session_id)) == [0, 1, 2]
+    assert db.documents[session_path(session_id)]["answerCount"] == 3
+    assert db.documents[("experiencePoints", USER_ID)]["score"] == 3 * 2 * 100
@@ -0,0 +1,63 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+from fastapi import HTTPException
+
+import chat_history
+from tests.fakes import WriteBatch
+
+
+def test_failed_load_is_not_cached(db, monkeypatch):
+    async def unavailable(user_id, chat_session_id):
+        raise RuntimeError("Firestore unavailable")
+
+    monkeypatch.setattr(chat_history, "_load_session", unavailable)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(chat_history.get_chat_session("user-1", "chat-1"))
+
+    assert error.value.status_code == 503
+    assert ("user-1", "chat-1") not in chat_history.hot_sessions
+
+
+def test_context_window_keeps_the_recent_turns(monkeypatch):
+    monkeypatch.setattr(chat_history, "CHAT_CONTEXT_TURNS", 2)
+    recent = [
+        {"role": role, "text": f"{role} {turn}"}
+        for turn in range(6)
+        for role in ("user", "model")
+    ]
+    state = {"summary": "Earlier.", "recent": recent}
+
+    summary, messages = chat_history.context_window(state)
+
+    assert summary == "Earlier."
+    assert messages == recent[-4:]
+
+
+def test_failed_save_drops_the_cached_session(db, monkeypatch):
+    monkeypatch.setattr(chat_history, "hot_sessions", OrderedDict())
+    messages_path = ("chatHistory", "user-1", "chatSessions", "chat-1", "messages")
+    db.documents[messages_path + ("a",)] = {"index": 0, "role": "user", "text": "Hi"}
+    db.documents[messages_path + ("b",)] = {"index": 1, "role": "model", "text": "Hey"}
+    exchange = [{"role": "user", "text": "Lost?"}, {"role": "model", "text": "Yes."}]
+
+    async def failing_commit(self):
+        raise RuntimeError("Firestore unavailable")
+
+    async def test():
+        state = await chat_history.get_chat_session("user-1", "chat-1")
+        with monkeypatch.context() as patch:
+            patch.setattr(WriteBatch, "commit", failing_commit)
+            await chat_history.append_chat_messages("user-1", "chat-1", state, exchange)
+        assert ("user-1", "chat-1") not in chat_history.hot_sessions
+
+        reloaded = await chat_history.get_chat_session("user-1", "chat-1")
+        assert reloaded["message_count"] == 2
+        assert [message["text"] for message in reloaded["recent"]] == ["Hi", "Hey"]
+        await chat_history.append_chat_messages("user-1", "chat-1", reloaded, exchange)
+
+    asyncio.run(test())
+
+    stored = [data for path, data in db.documents.items() if path[:-1] == messages_path]
+    assert sorted(message["index"] for message in stored) == [0, 1, 2, 3]
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+import images
+
+
+def encode(image, format):
+    output = io.BytesIO()
+    image.save(output, format=format)
+    return output.getvalue()
+
+
+def test_gif_is_converted():
+    data, mime_type = images._process(encode(Image.new("RGB", (40, 30)), "GIF"))
+
+    assert mime_type in ("image/jpeg", "image/png")
+    assert images.sniff_mime_type(data) == mime_type
+
+
+def test_large_image_is_downscaled():
+    side = images.IMAGE_MAX_DIMENSION * 2
+    data, mime_type = images._process(encode(Image.new("RGB", (side, side)), "PNG"))
+
+    assert mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(data)) as image:
+        assert max(image.size) == images.IMAGE_MAX_DIMENSION
+
+
+def test_small_supported_image_is_passed_through():
+    original = encode(Image.new("RGB", (40, 30)), "PNG")
+
+    assert images._process(original) == (original, "image/png")
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        images._process(b"%PDF-1.7 not an image")
+
+    assert error.value.status_code == 415
+
+
+def test_image_over_the_pixel_limit_is_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_MAX_PIXELS", 100 * 100)
+    decoded = []
+    monkeypatch.setattr(images, "_reencode", lambda data: decoded.append(data))
+
+    with pytest.raises(HTTPException) as error:
+        images._process(encode(Image.new("RGB", (101, 100)), "PNG"))
+
+    assert error.value.status_code == 413
+    assert decoded == []
@@ -0,0 +1,63 @@
+import asyncio
+
+from tests.conftest import USER_ID
+from tests.test_answer import session_path, start
+
+
+async def answer(client, session_id, times):
+    for _ in range(times):
+        response = await client.post(
+            "/v1/answer", json={"sessionId": session_id, "answer": "Index funds."}
+        )
+        assert response.status_code == 200
+
+
+async def walk(client, session_id, limit):
+    indexes, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = await client.get(f"/v1/progress/{session_id}", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        indexes += [entry["index"] for entry in page["history"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return indexes, page["score"]
+
+
+def test_cursor_walk_returns_every_answer_once(api):
+    async def test(client):
+        session_id = await start(client)
+        for _ in range(3):
+            # Only one of each burst answers the current question
+            await asyncio.gather(
+                *[answer(client, session_id, 1) for _ in range(3)],
+                return_exceptions=True,
+            )
+        await answer(client, session_id, 3)
+        return await walk(client, session_id, limit=4)
+
+    indexes, score = api(test)
+
+    assert indexes == [0, 1, 2, 3, 4, 5]
+    assert score == 6 * 2
+
+
+def test_inline_history_is_numbered_before_the_subcollection(api, db):
+    async def test(client):
+        session_id = await start(client)
+        # A session saved before history moved to a subcollection
+        session = db.documents[session_path(session_id)]
+        del session["answerCount"]
+        session["history"] = [
+            {"question": "Old?", "userAnswer": "a", "evaluation": "ok", "score": 1}
+        ] * 3
+        await answer(client, session_id, 2)
+        return await walk(client, session_id, limit=2)
+
+    indexes, _ = api(test)
+
+    assert indexes == [0, 1, 2, 3, 4]
+    assert db.documents[("experiencePoints", USER_ID)]["score"] == 2 * 2 * 500
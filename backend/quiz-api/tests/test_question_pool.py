@@ -0,0 +1,67 @@
+import asyncio
+
+from background import background_tasks
+from functions import get_topic_index, topic_id_for
+
+
+def pool_docs(db):
+    return [data for path, data in db.documents.items() if path[0] == "questionPool"]
+
+
+async def settle():
+    while background_tasks:
+        await asyncio.gather(*list(background_tasks))
+
+
+def test_start_on_an_empty_pool_refills_only_a_few_topics(api, db, gemini, pool):
+    async def test(client):
+        response = await client.post("/v1/start", json={"level": "Beginner"})
+        assert response.status_code == 200
+        await settle()
+
+    api(test)
+
+    # One question for the user, then QUESTION_POOL_SIZE for each refilled topic
+    assert (
+        gemini.calls == 1 + pool.QUESTION_POOL_REFILL_TOPICS * pool.QUESTION_POOL_SIZE
+    )
+    topic_index = get_topic_index()
+    docs = pool_docs(db)
+    assert len(docs) == pool.QUESTION_POOL_REFILL_TOPICS * pool.QUESTION_POOL_SIZE
+    for doc in docs:
+        assert topic_index.levels[doc["topicId"]] == "Beginner"
+        assert topic_id_for(doc["level"], doc["topic"]) == doc["topicId"]
+
+
+def test_stored_pool_loads_by_topic_id_without_regenerating(api, db, gemini, pool):
+    topic_index = get_topic_index()
+    topic_id = topic_index.ids_by_level["Intermediate"][0]
+    topic = topic_index.topics[topic_id]
+    # Every Intermediate topic already has a full buffer; one doc predates topicId
+    for other_id in topic_index.ids_by_level["Intermediate"]:
+        for n in range(pool.QUESTION_POOL_SIZE):
+            entry = {
+                "level": "Intermediate",
+                "topic": topic_index.topics[other_id],
+                "question": f"Pooled {other_id} {n}?",
+            }
+            if not (other_id == topic_id and n == 0):
+                entry["topicId"] = other_id
+            db.documents[("questionPool", f"{other_id}-{n}")] = entry
+    stored = len(pool_docs(db))
+
+    async def test(client):
+        await pool.load_level("Intermediate")
+        assert len(pool.question_pool[topic_id]) == pool.QUESTION_POOL_SIZE
+        response = await client.post("/v1/start", json={"level": "Intermediate"})
+        assert response.status_code == 200
+        await settle()
+        return response.json()["message"]
+
+    question = api(test)
+
+    assert question.startswith("Pooled ")
+    assert topic in {doc["topic"] for doc in pool_docs(db)}
+    # Only the served question was replaced; nothing else was short
+    assert gemini.calls == 1
+    assert len(pool_docs(db)) == stored
@@ -0,0 +1,55 @@
+from functions import TopicIndex, topic_id_for
+from tests.conftest import USER_ID
+from tests.test_answer import session_path
+
+ROWS = [
+    {"Topic": "Budgeting", "Difficulty": "Beginner"},
+    {"Topic": "Bond Pricing", "Difficulty": "Intermediate"},
+    {"Topic": "Options Greeks", "Difficulty": "Advanced"},
+]
+
+
+def test_topic_ids_survive_inserted_and_reordered_rows():
+    before = TopicIndex(ROWS)
+    after = TopicIndex(
+        [{"Topic": "Credit Scores", "Difficulty": "Beginner"}] + ROWS[::-1]
+    )
+
+    for topic_id, topic in before.topics.items():
+        assert after.topics[topic_id] == topic
+        assert after.levels[topic_id] == before.levels[topic_id]
+    assert topic_id_for("Beginner", "Budgeting") in after.ids_by_level["Beginner"]
+
+
+def test_repeated_rows_share_one_topic_id():
+    index = TopicIndex(ROWS + [ROWS[1]])
+
+    assert len(index.topics) == 3
+    assert index.ids_by_level["Intermediate"] == [
+        topic_id_for("Intermediate", "Bond Pricing")
+    ]
+
+
+def test_answer_with_an_unknown_topic_id(api, db):
+    # A session whose topic has since left the catalogue, or that stored a row number
+    db.documents[session_path("old")] = {
+        "userId": USER_ID,
+        "sessionId": "old",
+        "level": "Beginner",
+        "answerCount": 0,
+        "askedQuestions": ["What is a budget?"],
+        "askedTopicIds": [3],
+        "currentTopicId": 3,
+        "currentQuestion": {"Topic": "What is a budget?"},
+        "score": 0,
+    }
+
+    async def test(client):
+        return await client.post(
+            "/v1/answer", json={"sessionId": "old", "answer": "A plan."}
+        )
+
+    response = api(test)
+
+    assert response.status_code == 200
+    assert ("topics", "AskedTopics") not in db.documents
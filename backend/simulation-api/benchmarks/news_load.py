@@ -0,0 +1,123 @@
+"""
+Fires concurrent /fakestockdata?news=true requests at the app in-process,
+with Gemini replaced by a stub that sleeps, and probes /llm-metrics
+meanwhile to see how long other requests wait for the event loop.
+
+    python benchmarks/news_load.py --users 50 --renderer pil
+
+Each user gets a different random_seed, so no news is cached or shared.
+The Gemini gateway's limits are raised so they don't throttle the run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class StubGemini:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.aio = types.SimpleNamespace(models=self)
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        article = {"date": "January 15th", "headline": "Stub", "article": "Stub."}
+        return types.SimpleNamespace(text=json.dumps({"response": [article]}))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def report(name, seconds):
+    print(
+        f"{name:>17}: p50 {percentile(seconds, 50) * 1000:7.1f} ms"
+        f"  p95 {percentile(seconds, 95) * 1000:7.1f} ms"
+        f"  max {max(seconds) * 1000:7.1f} ms"
+    )
+
+
+async def run(args):
+    import httpx
+
+    import functions
+    import main
+
+    functions.get_genai_client = lambda: StubGemini(args.gemini_latency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+
+        async def user(seed):
+            started = time.perf_counter()
+            response = await client.get(
+                "/fakestockdata",
+                params={
+                    "news": "true",
+                    "random_seed": seed,
+                    "interval": args.interval,
+                    "days": args.days,
+                },
+            )
+            response.raise_for_status()
+            return time.perf_counter() - started
+
+        probes = []
+        done = asyncio.Event()
+
+        async def probe():
+            # A request plus a 20 ms sleep; anything beyond that is time spent
+            # waiting for the event loop
+            while not done.is_set():
+                started = time.perf_counter()
+                (await client.get("/llm-metrics")).raise_for_status()
+                await asyncio.sleep(0.02)
+                probes.append(time.perf_counter() - started - 0.02)
+
+        # One request first, so lazy imports (google.genai) aren't measured
+        await user(args.users)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*[user(seed) for seed in range(args.users)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    print(
+        f"{args.users} users, {args.interval} x {args.days} days, "
+        f"{args.renderer} renderer, Gemini stub {args.gemini_latency * 1000:.0f} ms"
+    )
+    print(f"{'wall time':>17}: {elapsed:.2f} s ({args.users / elapsed:.1f} req/s)")
+    report("request latency", latencies)
+    report(f"loop probe (x{len(probes)})", probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--renderer", choices=["pil", "mplfinance"], default="pil")
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    # Read at import time, so they have to be set before main is imported
+    os.environ["CHART_RENDERER"] = args.renderer
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(args.users))
+    os.environ.setdefault("GEMINI_RATE_LIMIT", "1000")
+    os.environ.setdefault("GEMINI_BURST", str(args.users))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
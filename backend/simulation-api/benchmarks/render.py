@@ -0,0 +1,89 @@
+"""
+Times the news chart renderers and tracks process memory over repeated calls.
+
+    python benchmarks/render.py --renderer pil --calls 1000
+    python benchmarks/render.py --renderer mplfinance --calls 1000
+    python benchmarks/render.py --renderer mplfinance --no-close --calls 200
+
+--no-close skips plt.close, as the mplfinance renderer did before it closed
+its figures, to show the memory pyplot held on to per call.
+"""
+
+import argparse
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import functions  # noqa: E402
+
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--renderer", choices=["pil", "mplfinance"], default="pil")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--no-close", action="store_true")
+    args = parser.parse_args()
+
+    functions.CHART_RENDERER = args.renderer
+    if args.no_close:
+        import matplotlib.pyplot as plt
+
+        plt.close = lambda fig=None: None
+
+    ohlcv = functions.simulate_ohlcv(
+        100.0,
+        None,
+        args.days,
+        0.01,
+        0.0005,
+        10_000_000,
+        args.interval,
+        42,
+        None,
+        "2023-01-01",
+    )
+    rows = functions.ohlcv_to_rows(ohlcv, "TIC", "Test Inc")
+
+    # The first calls pay for imports, font loading and allocator growth
+    for _ in range(max(args.warmup, 1)):
+        functions.plot_candlestick_chart_and_get_image_data(rows, "TIC")
+    start_rss = rss_mb()
+
+    timings = []
+    for call in range(1, args.calls + 1):
+        started = time.perf_counter()
+        functions.plot_candlestick_chart_and_get_image_data(rows, "TIC")
+        timings.append(time.perf_counter() - started)
+        if call % max(args.calls // 5, 1) == 0:
+            print(f"{call:>6} calls  rss {rss_mb():8.1f} MB")
+
+    timings.sort()
+    print(
+        f"{args.renderer}, {len(rows):,} candles: "
+        f"mean {statistics.mean(timings) * 1000:.1f} ms, "
+        f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.1f} ms, "
+        f"rss growth {rss_mb() - start_rss:+.1f} MB over {args.calls} calls"
+    )
+
+
+if __name__ == "__main__":
+    main()
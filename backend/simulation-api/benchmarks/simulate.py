@@ -0,0 +1,72 @@
+"""
+Measures how many simulated candles per second the vectorized engine
+produces at each supported interval.
+
+    python benchmarks/simulate.py --days 365
+
+"engine" is simulate_ohlcv alone; "rows" adds building the row dicts that
+/fakestockdata returns by default.
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from functions import (  # noqa: E402
+    INTERVAL_MAP,
+    get_intervals_per_day,
+    ohlcv_to_rows,
+    simulate_ohlcv,
+)
+
+MIN_SECONDS = 0.5  # per measurement, repeating short runs
+
+
+def candles_per_second(work, candles: int) -> float:
+    runs, started = 0, time.perf_counter()
+    while True:
+        work()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_SECONDS:
+            return candles * runs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    # pandas warns about some of INTERVAL_MAP's frequency aliases
+    warnings.simplefilter("ignore", FutureWarning)
+
+    print(f"{'interval':>8} {'candles':>9} {'engine/s':>12} {'rows/s':>12}")
+    for interval in INTERVAL_MAP:
+        candles = int(args.days * get_intervals_per_day(interval))
+
+        def simulate():
+            return simulate_ohlcv(
+                100.0,
+                None,
+                args.days,
+                0.01,
+                0.0005,
+                10_000_000,
+                interval,
+                42,
+                None,
+                "2023-01-01",
+            )
+
+        engine = candles_per_second(simulate, candles)
+        rows = candles_per_second(
+            lambda: ohlcv_to_rows(simulate(), "TIC", "Test Inc"), candles
+        )
+        print(f"{interval:>8} {candles:>9,} {engine:>12,.0f} {rows:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares building /stock-data rows with the original iterrows loop against
+get_stock_data's column-wise conversion, on a synthetic 1m history.
+
+    python benchmarks/stock_rows.py --rows 100000
+
+yfinance is not called: the market-data lookups are replaced with the
+synthetic history, so only the conversion is timed.
+"""
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import functions  # noqa: E402
+
+INFO = {"shortName": "Test Inc.", "previousClose": 143.2}
+
+
+def make_history(rows: int) -> pd.DataFrame:
+    """Regular-session 1m bars in New York time, shaped like yfinance's history."""
+    sessions = pd.bdate_range("2024-01-02", periods=math.ceil(rows / 390))
+    minutes = pd.timedelta_range("9h30min", periods=390, freq="min")
+    index = pd.DatetimeIndex(
+        [session + minute for session in sessions for minute in minutes][:rows]
+    ).tz_localize("America/New_York")
+
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, rows)) * close
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Volume": rng.integers(1_000, 100_000, rows).astype(float),
+        },
+        index=index,
+    )
+
+
+def iterrows_rows(symbol: str, info: dict, history: pd.DataFrame) -> list:
+    """The conversion get_stock_data used before it went column-wise."""
+    stock_data = []
+    for index, row in history.iterrows():
+        timestamp = index.to_pydatetime().isoformat() + "Z"
+        stock_data.append(
+            {
+                "symbol": symbol.upper(),
+                "company_name": info.get("shortName", "Unknown"),
+                "current_price": round(row["Close"], 2),
+                "change": round(row["Close"] - row["Open"], 2),
+                "change_percent": (
+                    round(((row["Close"] - row["Open"]) / row["Open"]) * 100, 2)
+                    if row["Open"]
+                    else 0
+                ),
+                "open": round(row["Open"], 2),
+                "high": round(row["High"], 2),
+                "low": round(row["Low"], 2),
+                "previous_close": round(info.get("previousClose", row["Close"]), 2),
+                "volume": int(row["Volume"]),
+                "timestamp": timestamp,
+            }
+        )
+    return stock_data
+
+
+def timed(work):
+    started = time.perf_counter()
+    result = work()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    history = make_history(args.rows)
+    functions.get_ticker_info = lambda symbol: INFO
+    functions.get_ticker_history = lambda symbol, days, interval: history
+
+    before, before_seconds = timed(lambda: iterrows_rows("TIC", INFO, history))
+    after, after_seconds = timed(lambda: functions.get_stock_data("TIC", 1, "1m"))
+
+    print(f"{len(history):,} rows")
+    for name, seconds in (("iterrows", before_seconds), ("column-wise", after_seconds)):
+        print(f"  {name:<12} {seconds:7.2f} s {len(history) / seconds:>12,.0f} rows/s")
+    print(f"  speedup      {before_seconds / after_seconds:7.1f}x")
+    print(f"  identical rows: {before == after['data']}")
+
+
+if __name__ == "__main__":
+    main()
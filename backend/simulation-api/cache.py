@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", 24 * 60 * 60))  # seconds
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", 1024))
+NEWS_CACHE_PATH = os.getenv("NEWS_CACHE_PATH")  # SQLite file, in-process if unset
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Hashes a tuple of JSON-serializable values into a stable cache key."""
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """On-disk LRU cache backed by SQLite, so entries survive restarts."""
+
+    def __init__(self, path: str, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            # Drop expired entries, then the least recently used beyond max_size
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                """DELETE FROM cache WHERE key NOT IN (
+                    SELECT key FROM cache ORDER BY last_used DESC LIMIT ?
+                )""",
+                (self.max_size,),
+            )
+            self._conn.commit()
+
+
+def create_cache(path: Optional[str], ttl: float, max_size: int):
+    if path:
+        return SQLiteCache(path, ttl, max_size)
+    return MemoryCache(ttl, max_size)
+
+
+news_cache = create_cache(NEWS_CACHE_PATH, NEWS_CACHE_TTL, NEWS_CACHE_SIZE)
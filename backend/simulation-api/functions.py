@@ -1,16 +1,24 @@
 import io
 import json
+import logging
 import os
-from typing import Dict, List, Optional
-
-import mplfinance as mpf
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Union
+
+import anyio
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from PIL import Image
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageDraw, ImageFont
+
+from cache import news_cache
+from llm_gateway import gateway, request_key
+from market_data import get_ticker_history, get_ticker_info
 
 load_dotenv(".env")
 
@@ -19,16 +27,73 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 def get_stock_info(symbol: str):
     try:
-        response = yf.Ticker(symbol)
-        return response.info
+        return get_ticker_info(symbol)
     except Exception as e:
         return {"error": "INVALID SYMBOL"}
 
 
-def get_stock_data(symbol: str, days: int = 1, interval: str = "1d"):
+def downsample_history(history: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Aggregates a yfinance history into at most max_points OHLCV candles."""
+    ohlcv = downsample_ohlcv(
+        {
+            "open": history["Open"].to_numpy(),
+            "high": history["High"].to_numpy(),
+            "low": history["Low"].to_numpy(),
+            "close": history["Close"].to_numpy(),
+            "volume": history["Volume"].to_numpy(),
+            "timestamp": history.index,
+        },
+        max_points,
+    )
+    return pd.DataFrame(
+        {
+            "Open": ohlcv["open"],
+            "High": ohlcv["high"],
+            "Low": ohlcv["low"],
+            "Close": ohlcv["close"],
+            "Volume": ohlcv["volume"],
+        },
+        index=ohlcv["timestamp"],
+    )
+
+
+def format_history_timestamps(index: pd.DatetimeIndex) -> List[str]:
+    """
+    Formats a whole DatetimeIndex like datetime.isoformat() + "Z", without a
+    Python datetime per row.
+    """
+    if index.tz is None:
+        text = np.datetime_as_string(index.values, unit="s")
+        return np.char.add(text, "Z").tolist()
+
+    local = index.tz_localize(None)
+    text = np.datetime_as_string(local.values, unit="s")
+
+    # Only a handful of distinct UTC offsets (e.g. DST changes) occur per series
+    offset_seconds = (local - index.tz_convert("UTC").tz_localize(None)).total_seconds()
+    unique_offsets, inverse = np.unique(offset_seconds.astype(int), return_inverse=True)
+    suffixes = []
+    for offset in unique_offsets:
+        sign = "-" if offset < 0 else "+"
+        hours, minutes = divmod(abs(int(offset)) // 60, 60)
+        suffixes.append(f"{sign}{hours:02d}:{minutes:02d}Z")
+    return np.char.add(text, np.array(suffixes)[inverse]).tolist()
+
+
+def get_stock_data(
+    symbol: str,
+    days: int = 1,
+    interval: str = "1d",
+    columnar: bool = False,
+    max_points: Optional[int] = None,
+):
     """
     Fetch stock data for a given stock symbol, time period, and interval.
     Example query: /stock-data/?symbol=AAPL&days=5&interval=1h
+
+    With columnar=True, "data" holds one array per OHLCV field and the
+    company metadata is returned once instead of on every candle. With
+    max_points, the history is aggregated into at most that many candles.
     """
     try:
         # Validate interval
@@ -36,10 +101,9 @@ def get_stock_data(symbol: str, days: int = 1, interval: str = "1d"):
         if interval not in valid_intervals:
             return {"error": f"Invalid interval. Choose from {valid_intervals}"}
 
-        # Fetch stock data
-        stock = yf.Ticker(symbol)
-        info = stock.info  # General company info
-        history = stock.history(period=f"{days}d", interval=interval)
+        # Fetch stock data, served from the market-data cache when possible
+        info = get_ticker_info(symbol)  # General company info
+        history = get_ticker_history(symbol, days, interval)
 
         # Ensure data is available
         if history.empty:
@@ -47,29 +111,78 @@ def get_stock_data(symbol: str, days: int = 1, interval: str = "1d"):
                 "error": "No data found. Check the stock symbol or try again later."
             }
 
-        # Convert stock data into the required format
-        stock_data = []
-        for index, row in history.iterrows():
-            timestamp = index.to_pydatetime().isoformat() + "Z"
-            stock_data.append(
-                {
-                    "symbol": symbol.upper(),
-                    "company_name": info.get("shortName", "Unknown"),
-                    "current_price": round(row["Close"], 2),
-                    "change": round(row["Close"] - row["Open"], 2),
-                    "change_percent": (
-                        round(((row["Close"] - row["Open"]) / row["Open"]) * 100, 2)
-                        if row["Open"]
-                        else 0
-                    ),
-                    "open": round(row["Open"], 2),
-                    "high": round(row["High"], 2),
-                    "low": round(row["Low"], 2),
-                    "previous_close": round(info.get("previousClose", row["Close"]), 2),
-                    "volume": int(row["Volume"]),
-                    "timestamp": timestamp,
-                }
-            )
+        if max_points:
+            history = downsample_history(history, max_points)
+
+        company_name = info.get("shortName", "Unknown")
+        timestamps = format_history_timestamps(history.index)
+
+        if columnar:
+            return {
+                "stock": symbol.upper(),
+                "interval": interval,
+                "company_name": company_name,
+                "previous_close": info.get("previousClose"),
+                "data": {
+                    "open": history["Open"].round(2).tolist(),
+                    "high": history["High"].round(2).tolist(),
+                    "low": history["Low"].round(2).tolist(),
+                    "close": history["Close"].round(2).tolist(),
+                    "volume": history["Volume"].astype("int64").tolist(),
+                    "timestamp": timestamps,
+                },
+            }
+
+        # Convert stock data into the required format, one column at a time
+        opens = history["Open"].to_numpy(dtype=float)
+        closes = history["Close"].to_numpy(dtype=float)
+        change = closes - opens
+        change_percent = np.divide(
+            change * 100, opens, out=np.zeros_like(change), where=opens != 0
+        )
+        previous_close = info.get("previousClose")
+        if previous_close is None:
+            previous_closes = np.round(closes, 2).tolist()
+        else:
+            previous_closes = [round(previous_close, 2)] * len(closes)
+
+        columns = zip(
+            np.round(closes, 2).tolist(),
+            np.round(change, 2).tolist(),
+            np.round(change_percent, 2).tolist(),
+            np.round(opens, 2).tolist(),
+            history["High"].round(2).tolist(),
+            history["Low"].round(2).tolist(),
+            previous_closes,
+            history["Volume"].astype("int64").tolist(),
+            timestamps,
+        )
+        stock_data = [
+            {
+                "symbol": symbol.upper(),
+                "company_name": company_name,
+                "current_price": close_price,
+                "change": change_value,
+                "change_percent": change_pct,
+                "open": open_price,
+                "high": high_price,
+                "low": low_price,
+                "previous_close": prev_close,
+                "volume": volume,
+                "timestamp": timestamp,
+            }
+            for (
+                close_price,
+                change_value,
+                change_pct,
+                open_price,
+                high_price,
+                low_price,
+                prev_close,
+                volume,
+                timestamp,
+            ) in columns
+        ]
 
         return {"stock": symbol.upper(), "interval": interval, "data": stock_data}
 
@@ -77,174 +190,705 @@ def get_stock_data(symbol: str, days: int = 1, interval: str = "1d"):
         return {"error": "INVALID REQUEST. CHECK TRADING SYMBOL"}
 
 
-async def generate_stock_data(
-    symbol: str,
-    company_name: str,
-    start_price: float,
-    end_price: Optional[float],
-    days: int,
-    volatility: float,
-    drift: float,
-    volume_mean: int,
-    interval: str,
-    random_seed: Optional[int],
-    turning_points: Optional[Dict[int, float]],
-    start_date: str,
-) -> List[Dict]:
-    """Generates synthetic stock price data asynchronously."""
-
-    INTERVAL_MAP = {
-        "1m": "T",
-        "2m": "2T",
-        "5m": "5T",
-        "15m": "15T",
-        "30m": "30T",
-        "1h": "H",
-        "1d": "D",
-        "1wk": "W",
-        "1mo": "MS",
-    }
+INTERVAL_MAP = {
+    "1m": "T",
+    "2m": "2T",
+    "5m": "5T",
+    "15m": "15T",
+    "30m": "30T",
+    "1h": "H",
+    "1d": "D",
+    "1wk": "W",
+    "1mo": "MS",
+}
 
-    if random_seed is not None:
-        np.random.seed(random_seed)
 
+def get_intervals_per_day(interval: str) -> float:
+    """Returns how many candles of the given interval fit in a single day."""
     if interval not in INTERVAL_MAP:
         raise ValueError(
             f"Invalid interval '{interval}'. Choose from {list(INTERVAL_MAP.keys())}"
         )
 
-    # Calculate the total number of intervals based on the interval and days
     if interval.endswith("m"):
         minutes = int(interval[:-1])
-        intervals_per_day = 24 * 60 // minutes
+        return 24 * 60 // minutes
     elif interval.endswith("h"):
         hours = int(interval[:-1])
-        intervals_per_day = 24 // hours
+        return 24 // hours
     elif interval.endswith("d"):
-        intervals_per_day = 1
+        return 1
     elif interval.endswith("wk"):
-        intervals_per_day = 1 / 7
+        return 1 / 7
     elif interval.endswith("mo"):
-        intervals_per_day = 1 / 30  # Approximation
+        return 1 / 30  # Approximation
     else:
         raise ValueError(f"Unsupported interval: {interval}")
 
-    total_intervals = int(days * intervals_per_day)
+
+STREAM_CHUNK_SIZE = 10000
+
+
+def iter_ohlcv_chunks(
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    volume_mean: int,
+    interval: str,
+    random_seed: Optional[int],
+    turning_points: Optional[Dict[int, float]],
+    start_date: str,
+    chunk_size: Optional[int] = STREAM_CHUNK_SIZE,
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Simulates a price path and yields it as OHLCV arrays of at most chunk_size candles.
+
+    Only the random state, the last close and the next timestamp are carried
+    between chunks, so memory stays constant however long the series is. Each
+    random quantity (returns, wick jitter, volumes) has its own Generator
+    spawned from random_seed, so the series does not depend on chunk_size.
+    """
+    total_intervals = int(days * get_intervals_per_day(interval))
+    chunk_size = chunk_size or total_intervals
+    returns_rng, open_rng, high_rng, low_rng, volume_rng = (
+        np.random.default_rng(seed)
+        for seed in np.random.SeedSequence(random_seed).spawn(5)
+    )
+
+    if end_price:
+        drift = (end_price / start_price) ** (1 / total_intervals) - 1  # Adjust drift
 
     freq = INTERVAL_MAP[interval]
-    date_range = pd.date_range(start=start_date, periods=total_intervals, freq=freq)
-    stock_prices = np.zeros(total_intervals)
-    stock_prices[0] = start_price
+    chunk_start = pd.Timestamp(start_date)
+    path_price = start_price  # Last simulated price, before turning points
+    last_close = start_price  # Last emitted close, after turning points
+    offset = 0
+
+    while True:
+        size = min(chunk_size, total_intervals - offset)
+
+        # Compound the chunk's returns at once; the very first candle opens the path
+        if offset == 0:
+            returns = returns_rng.normal(drift, volatility, max(size - 1, 0))
+            growth = np.concatenate(([1.0], 1 + returns))[:size]
+        else:
+            growth = 1 + returns_rng.normal(drift, volatility, size)
+        path = path_price * np.cumprod(growth)
+        close = path.copy()
+
+        if turning_points:
+            for day, price in turning_points.items():
+                if offset <= day < offset + size:
+                    close[day - offset] = price
+
+        previous_close = np.concatenate(([last_close], close[:-1]))[:size]
+        open_ = close * (1 + open_rng.uniform(-0.005, 0.005, size))
+        high = open_ * (1 + high_rng.uniform(0.001, 0.01, size))
+        low = open_ * (1 - low_rng.uniform(0.001, 0.01, size))
+        volume = volume_rng.normal(volume_mean, volume_mean * 0.1, size).astype(
+            np.int64
+        )
+
+        # One extra period gives the first timestamp of the next chunk
+        date_range = pd.date_range(start=chunk_start, periods=size + 1, freq=freq)
+
+        yield {
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "previous_close": previous_close,
+            "volume": volume,
+            "timestamp": date_range[:size],
+        }
+
+        offset += size
+        if offset >= total_intervals:
+            break
+        path_price = path[-1]
+        last_close = close[-1]
+        chunk_start = date_range[-1]
+
+
+def simulate_ohlcv(
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    volume_mean: int,
+    interval: str,
+    random_seed: Optional[int],
+    turning_points: Optional[Dict[int, float]],
+    start_date: str,
+) -> Dict[str, np.ndarray]:
+    """Simulates a whole price path in one vectorized pass and returns OHLCV arrays."""
+    return next(
+        iter_ohlcv_chunks(
+            start_price,
+            end_price,
+            days,
+            volatility,
+            drift,
+            volume_mean,
+            interval,
+            random_seed,
+            turning_points,
+            start_date,
+            chunk_size=None,
+        )
+    )
+
+
+def downsample_ohlcv(
+    ohlcv: Dict[str, np.ndarray], max_points: int
+) -> Dict[str, np.ndarray]:
+    """
+    Merges consecutive candles into at most max_points coarser candles.
+
+    Each bucket keeps the first open, the highest high, the lowest low, the
+    last close and the summed volume, stamped with its first timestamp.
+    """
+    count = len(ohlcv["close"])
+    if count <= max_points:
+        return ohlcv
+
+    bucket = -(-count // max_points)  # ceil division
+    starts = np.arange(0, count, bucket)
+    ends = np.minimum(starts + bucket, count) - 1
+
+    downsampled = {
+        "open": ohlcv["open"][starts],
+        "high": np.maximum.reduceat(ohlcv["high"], starts),
+        "low": np.minimum.reduceat(ohlcv["low"], starts),
+        "close": ohlcv["close"][ends],
+        "volume": np.add.reduceat(ohlcv["volume"], starts),
+        "timestamp": ohlcv["timestamp"][starts],
+    }
+    if "previous_close" in ohlcv:
+        downsampled["previous_close"] = ohlcv["previous_close"][starts]
+    return downsampled
+
+
+PATH_PERCENTILES = [5, 25, 50, 75, 95]
+MAX_BATCH_CELLS = 5_000_000  # paths x intervals per batch request
+# Paths returned as JSON cost far more to serialize and send than to simulate
+MAX_BATCH_PATH_CELLS = 200_000
+
+
+def simulate_paths(
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    interval: str,
+    random_seed: Optional[int],
+    n_paths: int,
+    correlation: float = 0.0,
+) -> np.ndarray:
+    """
+    Simulates n_paths close price paths at once and returns an (n_paths, T) matrix.
+
+    With a non-zero correlation every path shares a common market shock, so
+    the pairwise correlation of the returns equals `correlation`.
+    """
+    total_intervals = int(days * get_intervals_per_day(interval))
+    rng = np.random.default_rng(random_seed)
 
     if end_price:
         drift = (end_price / start_price) ** (1 / total_intervals) - 1  # Adjust drift
 
-    for i in range(1, total_intervals):
-        daily_return = np.random.normal(drift, volatility)
-        stock_prices[i] = stock_prices[i - 1] * (1 + daily_return)
-
-    if turning_points:
-        for day, price in turning_points.items():
-            if 0 <= day < total_intervals:
-                stock_prices[day] = price
-
-    data = []
-    for i in range(total_intervals):
-        open_price = stock_prices[i] * (1 + np.random.uniform(-0.005, 0.005))
-        high_price = open_price * (1 + np.random.uniform(0.001, 0.01))
-        low_price = open_price * (1 - np.random.uniform(0.001, 0.01))
-        close_price = stock_prices[i]
-        previous_close = stock_prices[i - 1] if i > 0 else start_price
-        change = close_price - previous_close
-        change_percent = (change / previous_close) * 100
-        volume = int(np.random.normal(volume_mean, volume_mean * 0.1))
-        timestamp = date_range[i].strftime("%Y-%m-%dT%H:%M:%SZ")  # No timezone
-
-        data.append(
-            {
-                "symbol": symbol,
-                "company_name": company_name,
-                "current_price": round(close_price, 2),
-                "change": round(change, 2),
-                "change_percent": round(change_percent, 2),
-                "open": round(open_price, 2),
-                "high": round(high_price, 2),
-                "low": round(low_price, 2),
-                "previous_close": round(previous_close, 2),
-                "volume": volume,
-                "timestamp": timestamp,
-            }
+    steps = max(total_intervals - 1, 0)
+    shocks = rng.standard_normal((n_paths, steps))
+    if correlation:
+        common = rng.standard_normal(steps)
+        shocks = np.sqrt(correlation) * common + np.sqrt(1 - correlation) * shocks
+
+    growth = np.ones((n_paths, total_intervals))
+    growth[:, 1:] += drift + volatility * shocks
+    return start_price * np.cumprod(growth, axis=1)
+
+
+def summarize_paths(paths: np.ndarray) -> Dict:
+    """Computes the terminal price distribution and max drawdowns of simulated paths."""
+    if paths.shape[1] == 0:
+        return {}
+
+    terminal = paths[:, -1]
+    running_max = np.maximum.accumulate(paths, axis=1)
+    max_drawdown = (1 - paths / running_max).max(axis=1)
+
+    return {
+        "terminal_price": {
+            "mean": round(float(terminal.mean()), 2),
+            "std": round(float(terminal.std()), 2),
+            "min": round(float(terminal.min()), 2),
+            "max": round(float(terminal.max()), 2),
+            "percentiles": {
+                f"p{p}": round(float(value), 2)
+                for p, value in zip(
+                    PATH_PERCENTILES, np.percentile(terminal, PATH_PERCENTILES)
+                )
+            },
+        },
+        "max_drawdown": {
+            "mean": round(float(max_drawdown.mean()), 4),
+            "max": round(float(max_drawdown.max()), 4),
+            "percentiles": {
+                f"p{p}": round(float(value), 4)
+                for p, value in zip(
+                    PATH_PERCENTILES, np.percentile(max_drawdown, PATH_PERCENTILES)
+                )
+            },
+        },
+    }
+
+
+def generate_path_batch(
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    interval: str,
+    random_seed: Optional[int],
+    start_date: str,
+    n_paths: int,
+    correlation: float = 0.0,
+    summary_only: bool = False,
+) -> Dict:
+    """Simulates a batch of paths and returns their summary, plus the paths unless summary_only."""
+    total_intervals = int(days * get_intervals_per_day(interval))
+    if n_paths * total_intervals > MAX_BATCH_CELLS:
+        raise ValueError(f"paths x intervals must not exceed {MAX_BATCH_CELLS}")
+    if not summary_only and n_paths * total_intervals > MAX_BATCH_PATH_CELLS:
+        raise ValueError(
+            f"paths x intervals must not exceed {MAX_BATCH_PATH_CELLS} "
+            "unless summary_only=true"
         )
 
-    return data
+    paths = simulate_paths(
+        start_price,
+        end_price,
+        days,
+        volatility,
+        drift,
+        interval,
+        random_seed,
+        n_paths,
+        correlation,
+    )
+    batch = {
+        "interval": interval,
+        "paths": n_paths,
+        "summary": summarize_paths(paths),
+    }
+    if not summary_only:
+        date_range = pd.date_range(
+            start=start_date, periods=total_intervals, freq=INTERVAL_MAP[interval]
+        )
+        batch["timestamp"] = format_timestamps(date_range)
+        batch["close"] = np.round(paths, 2).tolist()
+    return batch
 
 
-def plot_candlestick_chart_and_get_image_data(
-    stock_data: str, symbol: str = "TEST", currency: str = "RS"
-) -> Image.Image:
-    """Plots stock price as a candlestick chart, saves it to memory, and returns PIL.Image object."""
+def ohlcv_to_rows(
+    ohlcv: Dict[str, np.ndarray], symbol: str, company_name: str
+) -> List[Dict]:
+    """Converts simulated OHLCV arrays into the per-candle response payload."""
+    change = ohlcv["close"] - ohlcv["previous_close"]
+    change_percent = (change / ohlcv["previous_close"]) * 100
+    timestamps = format_timestamps(ohlcv["timestamp"])
+
+    columns = zip(
+        np.round(ohlcv["close"], 2).tolist(),
+        np.round(change, 2).tolist(),
+        np.round(change_percent, 2).tolist(),
+        np.round(ohlcv["open"], 2).tolist(),
+        np.round(ohlcv["high"], 2).tolist(),
+        np.round(ohlcv["low"], 2).tolist(),
+        np.round(ohlcv["previous_close"], 2).tolist(),
+        ohlcv["volume"].tolist(),
+        timestamps,
+    )
+
+    return [
+        {
+            "symbol": symbol,
+            "company_name": company_name,
+            "current_price": close_price,
+            "change": change_value,
+            "change_percent": change_pct,
+            "open": open_price,
+            "high": high_price,
+            "low": low_price,
+            "previous_close": prev_close,
+            "volume": volume,
+            "timestamp": timestamp,
+        }
+        for (
+            close_price,
+            change_value,
+            change_pct,
+            open_price,
+            high_price,
+            low_price,
+            prev_close,
+            volume,
+            timestamp,
+        ) in columns
+    ]
+
+
+def ohlcv_to_columns(ohlcv: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """Converts simulated OHLCV arrays into the columnar response payload."""
+    return {
+        "open": np.round(ohlcv["open"], 2).tolist(),
+        "high": np.round(ohlcv["high"], 2).tolist(),
+        "low": np.round(ohlcv["low"], 2).tolist(),
+        "close": np.round(ohlcv["close"], 2).tolist(),
+        "volume": ohlcv["volume"].tolist(),
+        "timestamp": format_timestamps(ohlcv["timestamp"]),
+    }
+
+
+OHLCV_BUFFER_MAGIC = b"OHLC"
+OHLCV_BUFFER_VERSION = 1
+OHLCV_BUFFER_HEADER = struct.Struct("<4sIQ")
+MAX_BINARY_CANDLES = 1_000_000  # 48 MB of OHLCV per /fakestockdata/binary response
+
+
+def ohlcv_to_buffer(ohlcv: Dict[str, np.ndarray]) -> memoryview:
+    """
+    Packs simulated OHLCV arrays into a compact little-endian binary payload.
+
+    Layout: a 16 byte header (b"OHLC", uint32 version, uint64 candle count)
+    followed by the open, high, low and close float64 arrays, then the volume
+    and unix-second timestamp int64 arrays. Every block is 8-byte aligned so
+    clients can view it directly as a Float64Array / BigInt64Array. Each
+    array is written straight into one preallocated buffer.
+    """
+    count = len(ohlcv["close"])
+    buffer = bytearray(OHLCV_BUFFER_HEADER.size + 6 * 8 * count)
+    OHLCV_BUFFER_HEADER.pack_into(
+        buffer, 0, OHLCV_BUFFER_MAGIC, OHLCV_BUFFER_VERSION, count
+    )
+
+    def block(index: int, dtype: str) -> np.ndarray:
+        offset = OHLCV_BUFFER_HEADER.size + index * 8 * count
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+    for index, field in enumerate(["open", "high", "low", "close"]):
+        block(index, "<f8")[:] = ohlcv[field]
+    block(4, "<i8")[:] = ohlcv["volume"]
+    np.floor_divide(ohlcv["timestamp"].asi8, 1_000_000_000, out=block(5, "<i8"))
+    return memoryview(buffer)
+
+
+def stream_stock_data(
+    symbol: str,
+    company_name: str,
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    volume_mean: int,
+    interval: str,
+    random_seed: Optional[int],
+    turning_points: Optional[Dict[int, float]],
+    start_date: str,
+    columnar: bool = False,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[str]:
+    """
+    Yields synthetic stock price data as NDJSON, one chunk at a time.
+
+    Each line is a candle in the row format, or a whole chunk as a columnar
+    frame when columnar=True.
+    """
+    for ohlcv in iter_ohlcv_chunks(
+        start_price,
+        end_price,
+        days,
+        volatility,
+        drift,
+        volume_mean,
+        interval,
+        random_seed,
+        turning_points,
+        start_date,
+        chunk_size=chunk_size,
+    ):
+        if columnar:
+            yield json.dumps(ohlcv_to_columns(ohlcv)) + "\n"
+        else:
+            rows = ohlcv_to_rows(ohlcv, symbol, company_name)
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def format_timestamps(date_range: pd.DatetimeIndex) -> List[str]:
+    """Formats a whole DatetimeIndex as "%Y-%m-%dT%H:%M:%SZ" strings (no timezone)."""
+    return np.char.add(np.datetime_as_string(date_range.values, unit="s"), "Z").tolist()
+
+
+def generate_stock_data(
+    symbol: str,
+    company_name: str,
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    volatility: float,
+    drift: float,
+    volume_mean: int,
+    interval: str,
+    random_seed: Optional[int],
+    turning_points: Optional[Dict[int, float]],
+    start_date: str,
+    columnar: bool = False,
+    max_points: Optional[int] = None,
+) -> Union[List[Dict], Dict[str, list]]:
+    """
+    Generates synthetic stock price data. CPU-bound, so async callers run it
+    in the threadpool.
+
+    Returns one dict per candle, or a dict of per-field arrays when columnar=True.
+    With max_points, the series is aggregated into at most that many candles.
+    """
+    ohlcv = simulate_ohlcv(
+        start_price,
+        end_price,
+        days,
+        volatility,
+        drift,
+        volume_mean,
+        interval,
+        random_seed,
+        turning_points,
+        start_date,
+    )
+    if max_points:
+        ohlcv = downsample_ohlcv(ohlcv, max_points)
+
+    if columnar:
+        return ohlcv_to_columns(ohlcv)
+
+    return ohlcv_to_rows(ohlcv, symbol, company_name)
+
+
+CHART_RENDERER = os.getenv("CHART_RENDERER", "pil")  # "pil" or "mplfinance"
+CHART_WIDTH = 768
+CHART_HEIGHT = 512
+
+CHART_RENDER_THREADS = int(os.getenv("CHART_RENDER_THREADS", 2))
+
+# Charts render in the threadpool, and pyplot's figure state isn't thread-safe
+_pyplot_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _render_limiter() -> anyio.CapacityLimiter:
+    return anyio.CapacityLimiter(CHART_RENDER_THREADS)
+
+
+def stock_data_to_frame(stock_data: Union[List[Dict], Dict[str, list]]) -> pd.DataFrame:
+    """Builds an OHLCV DataFrame indexed by timestamp from the row or columnar format."""
     df = pd.DataFrame(stock_data)
     df.set_index("timestamp", inplace=True)
     df.index = pd.to_datetime(df.index)
-    df = df[["open", "high", "low", "current_price", "volume"]]
     df.rename(columns={"current_price": "close"}, inplace=True)
+    return df[["open", "high", "low", "close", "volume"]]
+
+
+def render_candlestick_image(
+    stock_data: Union[List[Dict], Dict[str, list]],
+    symbol: str = "TEST",
+    currency: str = "RS",
+    width: int = CHART_WIDTH,
+    height: int = CHART_HEIGHT,
+) -> Image.Image:
+    """
+    Draws a candlestick and volume chart straight into a PIL image.
 
-    # Custom style with larger figure size and better visibility
-    fig, axlist = mpf.plot(
-        df,
-        type="candle",
-        style="charles",
-        title=f"{symbol} Candlestick Chart",
-        ylabel=f"Price ({currency})",
-        volume=True,
-        figsize=(12, 8),
-        returnfig=True,
+    Much cheaper than a matplotlib figure and sized for the model rather than
+    for people. Series with more candles than fit the plot (two pixels per
+    candle) are downsampled first.
+    """
+    df = stock_data_to_frame(stock_data)
+    left, right, top, bottom = 10, 70, 30, 24
+    plot_width = width - left - right
+    ohlcv = downsample_ohlcv(
+        {
+            "open": df["open"].to_numpy(dtype=float),
+            "high": df["high"].to_numpy(dtype=float),
+            "low": df["low"].to_numpy(dtype=float),
+            "close": df["close"].to_numpy(dtype=float),
+            "volume": df["volume"].to_numpy(dtype=float),
+            "timestamp": df.index,
+        },
+        max(plot_width // 2, 1),
+    )
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.text((left, 8), f"{symbol} Candlestick Chart", fill="black", font=font)
+
+    count = len(ohlcv["close"])
+    if count == 0:
+        return image
+
+    # Price panel on top, volume panel below it
+    plot_height = height - top - bottom
+    price_bottom = top + int(plot_height * 0.72)
+    volume_top = price_bottom + 8
+    volume_bottom = height - bottom
+
+    low, high = float(ohlcv["low"].min()), float(ohlcv["high"].max())
+    price_span = (high - low) or 1.0
+    max_volume = float(ohlcv["volume"].max()) or 1.0
+
+    step = plot_width / count
+    centers = left + (np.arange(count) + 0.5) * step
+    half_body = max(step * 0.35, 0.5)
+
+    def price_y(price):
+        return top + (high - price) / price_span * (price_bottom - top)
+
+    y_open = price_y(ohlcv["open"])
+    y_close = price_y(ohlcv["close"])
+    y_high = price_y(ohlcv["high"])
+    y_low = price_y(ohlcv["low"])
+    y_volume = volume_bottom - ohlcv["volume"] / max_volume * (
+        volume_bottom - volume_top
+    )
+    rising = ohlcv["close"] >= ohlcv["open"]
+
+    for i in range(count):
+        color = "#26a69a" if rising[i] else "#ef5350"
+        x = centers[i]
+        draw.line([(x, y_high[i]), (x, y_low[i])], fill=color)
+        body_top, body_bottom = sorted((y_open[i], y_close[i]))
+        draw.rectangle(
+            [
+                (x - half_body, body_top),
+                (x + half_body, max(body_bottom, body_top + 1)),
+            ],
+            fill=color,
+        )
+        draw.rectangle(
+            [(x - half_body, y_volume[i]), (x + half_body, volume_bottom)], fill=color
+        )
+
+    # Axes labels: price levels on the right, dates along the bottom
+    axis_x = left + plot_width + 4
+    for price in np.linspace(low, high, 5):
+        draw.text(
+            (axis_x, price_y(price) - 5),
+            f"{price:.2f} {currency}",
+            fill="black",
+            font=font,
+        )
+
+    timestamps = ohlcv["timestamp"]
+    date_format = (
+        "%Y-%m-%d"
+        if timestamps[-1] - timestamps[0] > pd.Timedelta(days=2)
+        else "%m-%d %H:%M"
     )
+    for i in np.linspace(0, count - 1, min(count, 6)).astype(int):
+        draw.text(
+            (max(centers[i] - 30, 0), volume_bottom + 6),
+            timestamps[i].strftime(date_format),
+            fill="black",
+            font=font,
+        )
 
-    # Increase font size
-    for ax in axlist:
-        ax.title.set_size(16)
-        ax.xaxis.label.set_size(14)
-        ax.yaxis.label.set_size(14)
-        ax.tick_params(axis="both", labelsize=12)
+    return image
 
-    # Save the figure to a memory buffer
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png")
+
+def plot_candlestick_chart_and_get_image_data(
+    stock_data: str, symbol: str = "TEST", currency: str = "RS"
+) -> Image.Image:
+    """Plots stock price as a candlestick chart, saves it to memory, and returns PIL.Image object."""
+    if CHART_RENDERER != "mplfinance":
+        return render_candlestick_image(stock_data, symbol, currency)
+
+    # Only this renderer needs matplotlib, which is slow to import
+    import matplotlib.pyplot as plt
+    import mplfinance as mpf
+
+    df = stock_data_to_frame(stock_data)
+
+    with _pyplot_lock:
+        # Custom style with larger figure size and better visibility
+        fig, axlist = mpf.plot(
+            df,
+            type="candle",
+            style="charles",
+            title=f"{symbol} Candlestick Chart",
+            ylabel=f"Price ({currency})",
+            volume=True,
+            figsize=(12, 8),
+            returnfig=True,
+        )
+
+        # Increase font size
+        for ax in axlist:
+            ax.title.set_size(16)
+            ax.xaxis.label.set_size(14)
+            ax.yaxis.label.set_size(14)
+            ax.tick_params(axis="both", labelsize=12)
+
+        # Save the figure to a memory buffer
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        plt.close(fig)  # Figures are never garbage collected while pyplot tracks them
     buf.seek(0)
 
     image = Image.open(buf)
     return image
 
 
+@lru_cache(maxsize=None)
+def get_genai_client():
+    """Creates the Gemini client on first use; google.genai is slow to import."""
+    from google import genai
+
+    return genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+
+
 async def get_news(image: Image.Image) -> Dict[str, List[Dict[str, str]]]:
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+    from google.genai import types
+
+    client = get_genai_client()
     generate_content_config = types.GenerateContentConfig(
         temperature=1,
         top_p=0.95,
         top_k=40,
         max_output_tokens=8192,
         response_mime_type="application/json",
-        response_schema=genai.types.Schema(
-            type=genai.types.Type.OBJECT,
+        response_schema=types.Schema(
+            type=types.Type.OBJECT,
             required=["response"],
             properties={
-                "response": genai.types.Schema(
-                    type=genai.types.Type.ARRAY,
-                    items=genai.types.Schema(
-                        type=genai.types.Type.OBJECT,
+                "response": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(
+                        type=types.Type.OBJECT,
                         required=["date", "headline", "article"],
                         properties={
-                            "date": genai.types.Schema(
-                                type=genai.types.Type.STRING,
+                            "date": types.Schema(
+                                type=types.Type.STRING,
                             ),
-                            "headline": genai.types.Schema(
-                                type=genai.types.Type.STRING,
+                            "headline": types.Schema(
+                                type=types.Type.STRING,
                             ),
-                            "article": genai.types.Schema(
-                                type=genai.types.Type.STRING,
+                            "article": types.Schema(
+                                type=types.Type.STRING,
                             ),
                         },
                     ),
@@ -272,9 +916,74 @@ Do not directly say the stock is going up or down. Do not reference the candlest
 
     content = "Generate some news articles for each month in the picture along with their headlines from the image that can be used to predict the the trends in the data. It will be sent to a player and they would need to predict the outcome. Give the news articles at different points of time."
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[content, image],
-        config=generate_content_config,
+    # Identical charts requested at the same time share a single Gemini call
+    response = await gateway.call(
+        lambda: client.aio.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=[content, image],
+            config=generate_content_config,
+        ),
+        key=request_key("gemini-2.0-flash", content, image.tobytes()),
     )
     return json.loads(response.text)
+
+
+async def get_chart_news(
+    stock_data: Union[List[Dict], Dict[str, list]], cache_key: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    Renders the chart for stock_data and generates its news articles.
+
+    When a cache_key is given (only deterministic, seeded simulations have
+    one), cached news is returned without rendering or calling Gemini.
+    """
+    # Rendering is CPU-bound and the news cache may be SQLite, and neither has
+    # an async API, so both run in the bounded threadpool
+    if cache_key:
+        cached = await run_in_threadpool(news_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
+    image = await anyio.to_thread.run_sync(
+        plot_candlestick_chart_and_get_image_data, stock_data, limiter=_render_limiter()
+    )
+    news = (await get_news(image))["response"]
+
+    if cache_key:
+        await run_in_threadpool(news_cache.set, cache_key, news)
+    return news
+
+
+NEWS_JOBS: "OrderedDict[str, Dict]" = OrderedDict()
+MAX_NEWS_JOBS = 1000
+
+
+def create_news_job() -> str:
+    """Registers a pending news job and returns its id, evicting the oldest jobs."""
+    job_id = uuid.uuid4().hex
+    NEWS_JOBS[job_id] = {"job_id": job_id, "status": "pending"}
+    while len(NEWS_JOBS) > MAX_NEWS_JOBS:
+        NEWS_JOBS.popitem(last=False)
+    return job_id
+
+
+def get_news_job(job_id: str) -> Optional[Dict]:
+    return NEWS_JOBS.get(job_id)
+
+
+async def run_news_job(
+    job_id: str,
+    stock_data: Union[List[Dict], Dict[str, list]],
+    cache_key: Optional[str] = None,
+):
+    """Renders the chart and generates the news for a job created by create_news_job."""
+    try:
+        news = await get_chart_news(stock_data, cache_key)
+        result = {"status": "done", "news": news}
+    except Exception as e:
+        logging.exception(e)
+        result = {"status": "failed"}
+
+    # The job may have been evicted while the news was being generated
+    if job_id in NEWS_JOBS:
+        NEWS_JOBS[job_id].update(result)
@@ -1,14 +1,33 @@
-from fastapi import FastAPI
+from typing import Literal, Optional
+
+import pandas as pd
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import FileResponse
+from starlette.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 
+from cache import make_cache_key
 from functions import (
+    MAX_BINARY_CANDLES,
+    create_news_job,
+    generate_path_batch,
     generate_stock_data,
-    get_news,
+    get_chart_news,
+    get_intervals_per_day,
+    get_news_job,
     get_stock_data,
     get_stock_info,
-    plot_candlestick_chart_and_get_image_data,
+    ohlcv_to_buffer,
+    run_news_job,
+    simulate_ohlcv,
+    stream_stock_data,
 )
+from llm_gateway import gateway, is_rate_limited
 
 app = FastAPI()
 
@@ -21,6 +40,33 @@ app.add_middleware(
 )
 
 
+def validate_simulation(
+    start_price: float,
+    end_price: Optional[float],
+    days: int,
+    interval: str,
+    start_date: str,
+):
+    """Raises a 400 for parameters the simulation would reject or divide by zero on."""
+    if days < 0:
+        raise HTTPException(status_code=400, detail="days must not be negative")
+    if start_price <= 0:
+        raise HTTPException(status_code=400, detail="start_price must be positive")
+    if end_price is not None and end_price < 0:
+        raise HTTPException(status_code=400, detail="end_price must not be negative")
+    try:
+        intervals_per_day = get_intervals_per_day(interval)
+        pd.Timestamp(start_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The drift is fitted to reach end_price over the whole series
+    if end_price and int(days * intervals_per_day) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="end_price needs at least one candle; increase days",
+        )
+
+
 @app.get("/")
 async def start_simulation():
     return FileResponse("frontend.html")
@@ -28,16 +74,31 @@ async def start_simulation():
 
 @app.get("/stock/{symbol}")
 async def get_info(symbol: str):
-    return get_stock_info(symbol)
+    # yfinance has no async API, so it runs in the bounded threadpool
+    return await run_in_threadpool(get_stock_info, symbol)
 
 
 @app.get("/stock-data")
-async def get_data(stock: str, days: int, interval: str = "1d"):
-    return get_stock_data(stock, days, interval)
+async def get_data(
+    stock: str,
+    days: int,
+    interval: str = "1d",
+    format: Literal["rows", "columnar"] = "rows",
+    max_points: int = Query(None, gt=0),
+):
+    return await run_in_threadpool(
+        get_stock_data,
+        stock,
+        days,
+        interval,
+        columnar=format == "columnar",
+        max_points=max_points,
+    )
 
 
 @app.get("/fakestockdata")
 async def get_fake_data(
+    background_tasks: BackgroundTasks,
     stock: str = "TIC",
     company_name: str = "Test Inc",
     start_price: float = 100.0,
@@ -49,10 +110,16 @@ async def get_fake_data(
     interval: str = "1d",
     random_seed: int = None,
     start_date: str = "2023-01-01",
+    format: Literal["rows", "columnar"] = "rows",
+    news: Literal["true", "false", "async"] = "true",
+    max_points: int = Query(None, gt=0),
 ):
     turning_points = None  # GET requests cannot send a JSON body directly
+    validate_simulation(start_price, end_price, days, interval, start_date)
 
-    fake_data = await generate_stock_data(
+    # Simulating and building the rows is CPU-bound, so it runs in the threadpool
+    fake_data = await run_in_threadpool(
+        generate_stock_data,
         stock,
         company_name,
         start_price,
@@ -65,16 +132,180 @@ async def get_fake_data(
         random_seed,
         turning_points,
         start_date,
+        columnar=format == "columnar",
+        max_points=max_points,
+    )
+
+    response = {"stock": stock, "interval": interval, "data": fake_data}
+    if format == "columnar":
+        response["company_name"] = company_name
+
+    # Seeded simulations are deterministic, so their news can be cached
+    cache_key = None
+    if random_seed is not None:
+        cache_key = make_cache_key(
+            "news",
+            stock,
+            company_name,
+            start_price,
+            end_price,
+            days,
+            volatility,
+            drift,
+            volume_mean,
+            interval,
+            random_seed,
+            start_date,
+            max_points,
+        )
+
+    if news == "true":
+        try:
+            response["news"] = await get_chart_news(fake_data, cache_key)
+        except Exception as e:
+            if not is_rate_limited(e):
+                raise
+            raise HTTPException(
+                status_code=429,
+                detail="Gemini is over its rate limit, try again shortly.",
+            )
+    elif news == "async":
+        # Return the candles now and generate the news after the response is sent
+        job_id = create_news_job()
+        background_tasks.add_task(run_news_job, job_id, fake_data, cache_key)
+        response["news_job_id"] = job_id
+    # Serialized in the threadpool too; a 1m series is hundreds of thousands of rows
+    return await run_in_threadpool(JSONResponse, response)
+
+
+@app.get("/fakestockdata/news/{job_id}")
+async def get_fake_data_news(job_id: str):
+    job = get_news_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="News job not found")
+    return job
+
+
+@app.get("/fakestockdata/binary")
+def get_fake_data_binary(
+    start_price: float = 100.0,
+    end_price: float = None,
+    days: int = 365,
+    volatility: float = 0.01,
+    drift: float = 0.0005,
+    volume_mean: int = 10000000,
+    interval: str = "1d",
+    random_seed: int = None,
+    start_date: str = "2023-01-01",
+):
+    """Returns simulated candles as raw little-endian OHLCV buffers, without news."""
+    # A plain def runs in the threadpool, so simulating and packing the
+    # candles doesn't block the event loop
+    validate_simulation(start_price, end_price, days, interval, start_date)
+    if days * get_intervals_per_day(interval) > MAX_BINARY_CANDLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"days x intervals per day must not exceed {MAX_BINARY_CANDLES}",
+        )
+    try:
+        ohlcv = simulate_ohlcv(
+            start_price,
+            end_price,
+            days,
+            volatility,
+            drift,
+            volume_mean,
+            interval,
+            random_seed,
+            None,
+            start_date,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(
+        content=ohlcv_to_buffer(ohlcv), media_type="application/octet-stream"
     )
 
-    image = plot_candlestick_chart_and_get_image_data(fake_data)
-    news = await get_news(image)
-    return {
-        "stock": stock,
-        "interval": interval,
-        "data": fake_data,
-        "news": news["response"],
-    }
+
+@app.get("/fakestockdata/stream")
+async def get_fake_data_stream(
+    stock: str = "TIC",
+    company_name: str = "Test Inc",
+    start_price: float = 100.0,
+    end_price: float = None,
+    days: int = 365,
+    volatility: float = 0.01,
+    drift: float = 0.0005,
+    volume_mean: int = 10000000,
+    interval: str = "1d",
+    random_seed: int = None,
+    start_date: str = "2023-01-01",
+    format: Literal["rows", "columnar"] = "rows",
+    chunk_size: int = Query(10000, gt=0, le=100000),
+):
+    """Streams simulated candles as NDJSON in fixed-size chunks, without news."""
+    # Checked up front: once streaming starts the 200 status has been sent
+    validate_simulation(start_price, end_price, days, interval, start_date)
+    chunks = stream_stock_data(
+        stock,
+        company_name,
+        start_price,
+        end_price,
+        days,
+        volatility,
+        drift,
+        volume_mean,
+        interval,
+        random_seed,
+        None,
+        start_date,
+        columnar=format == "columnar",
+        chunk_size=chunk_size,
+    )
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+
+@app.get("/fakestockdata/batch")
+def get_fake_data_batch(
+    start_price: float = 100.0,
+    end_price: float = None,
+    days: int = 365,
+    volatility: float = 0.01,
+    drift: float = 0.0005,
+    interval: str = "1d",
+    random_seed: int = None,
+    start_date: str = "2023-01-01",
+    paths: int = Query(100, gt=0, le=10000),
+    correlation: float = Query(0.0, ge=0.0, le=1.0),
+    summary_only: bool = False,
+):
+    """Simulates many close price paths in one pass, without news."""
+    # A plain def runs in the threadpool. Returning a JSONResponse serializes
+    # the paths here too, rather than on the event loop after returning.
+    validate_simulation(start_price, end_price, days, interval, start_date)
+    try:
+        batch = generate_path_batch(
+            start_price,
+            end_price,
+            days,
+            volatility,
+            drift,
+            interval,
+            random_seed,
+            start_date,
+            paths,
+            correlation,
+            summary_only,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(batch)
+
+
+@app.get("/llm-metrics")
+async def llm_metrics():
+    """Reports the Gemini gateway's queue depth, wait times and retry counts."""
+    return gateway.metrics()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from cache import MemoryCache
+
+load_dotenv(".env")
+
+MARKET_INFO_TTL = float(os.getenv("MARKET_INFO_TTL", 5 * 60))  # seconds
+MARKET_HISTORY_TTL = float(os.getenv("MARKET_HISTORY_TTL", 60))  # seconds
+MARKET_CACHE_SIZE = int(os.getenv("MARKET_CACHE_SIZE", 256))
+
+info_cache = MemoryCache(MARKET_INFO_TTL, MARKET_CACHE_SIZE)
+# History entries outlive MARKET_HISTORY_TTL so stale ones can be topped up
+history_cache = MemoryCache(24 * 60 * 60, MARKET_CACHE_SIZE)
+
+# key -> [lock, number of requests holding or waiting for it]
+_fetch_locks: Dict[tuple, List] = {}
+_fetch_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _fetch_lock(key: tuple):
+    """
+    Holds the lock shared by every request fetching the same upstream data.
+
+    The lock is dropped once no request holds or waits for it, so arbitrary
+    ticker symbols don't accumulate locks.
+    """
+    with _fetch_locks_guard:
+        entry = _fetch_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _fetch_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _fetch_locks[key]
+
+
+def _ticker(symbol: str):
+    # yfinance is slow to import and only needed on a cache miss
+    import yfinance as yf
+
+    return yf.Ticker(symbol)
+
+
+def _last_sessions(history: pd.DataFrame, days: int, interval: str) -> pd.DataFrame:
+    """Keeps the bars yfinance would return for period=f"{days}d"."""
+    if history.empty:
+        return history
+    if interval in ("1wk", "1mo"):
+        cutoff = history.index[-1] - pd.Timedelta(days=days)
+        return history[history.index >= cutoff]
+
+    # Intraday and daily periods count trading sessions, not calendar days
+    sessions = history.index.normalize().unique()
+    first_session = sessions[-min(days, len(sessions))]
+    return history[history.index.normalize() >= first_session]
+
+
+def get_ticker_info(symbol: str) -> Dict:
+    """Returns yfinance's info for symbol, fetched at most once per MARKET_INFO_TTL."""
+    key = symbol.upper()
+    info = info_cache.get(key)
+    if info is not None:
+        return info
+
+    # Concurrent requests for the same ticker wait for a single upstream fetch
+    with _fetch_lock(("info", key)):
+        info = info_cache.get(key)
+        if info is None:
+            info = _ticker(key).info
+            info_cache.set(key, info)
+    return info
+
+
+def _history_is_fresh(entry: Optional[Dict], days: int) -> bool:
+    return (
+        entry is not None
+        and entry["days"] >= days
+        and time.time() - entry["fetched_at"] <= MARKET_HISTORY_TTL
+    )
+
+
+def _refresh_history(key: tuple, days: int) -> Dict:
+    """Fetches or tops up the cached history for key, once across concurrent requests."""
+    symbol, interval = key
+    with _fetch_lock(("history",) + key):
+        entry = history_cache.get(key)
+        if _history_is_fresh(entry, days):
+            return entry  # Another request refreshed it while this one waited
+        if entry is None or entry["days"] < days:
+            history = _ticker(symbol).history(period=f"{days}d", interval=interval)
+            entry = {"history": history, "days": days, "fetched_at": time.time()}
+            if not history.empty:
+                history_cache.set(key, entry)
+        else:
+            history = entry["history"]
+            tail = _ticker(symbol).history(start=history.index[-1], interval=interval)
+            if not tail.empty:
+                # The last cached bar may have been incomplete, so the tail replaces it
+                history = pd.concat([history[history.index < tail.index[0]], tail])
+                history = _last_sessions(history, entry["days"], interval)
+            entry = {
+                "history": history,
+                "days": entry["days"],
+                "fetched_at": time.time(),
+            }
+            history_cache.set(key, entry)
+    return entry
+
+
+def get_ticker_history(symbol: str, days: int, interval: str) -> pd.DataFrame:
+    """
+    Returns the last `days` of OHLCV history for symbol, as yf.Ticker.history would.
+
+    History is cached per (symbol, interval). Once an entry is older than
+    MARKET_HISTORY_TTL only the bars since its last one are fetched and
+    appended; a request for more days than are cached refetches the period.
+    """
+    key = (symbol.upper(), interval)
+    entry = history_cache.get(key)
+    if not _history_is_fresh(entry, days):
+        # Only a miss or a stale entry waits for the single upstream fetch
+        entry = _refresh_history(key, days)
+    return _last_sessions(entry["history"], days, interval)